@@ -0,0 +1,44 @@
+import argparse
+import glob
+import sys
+from pareto.bench import (
+    BENCHES, run_benchmarks, standard_workloads, scaling_workloads, compare, save, load
+)
+from get_data import get_data
+from main import get_experiment_settings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark coverage, transport, get_candidates and full builds.')
+    parser.add_argument('--out', default='./bench/results.json', help='where to write the results')
+    parser.add_argument('--baseline', default=None, help='results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=.2, help='relative slowdown that counts as a regression')
+    parser.add_argument('--bench', nargs='*', choices=list(BENCHES), default=None, help='benchmarks to run. Defaults to all.')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='smaller scaling sweeps')
+    parser.add_argument('--no-scaling', action='store_true', help='only the standard workloads')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings_list = [get_experiment_settings(fi) for fi in sorted(glob.glob('./settings/*.json'))]
+    workloads = standard_workloads(get_data(), settings_list)
+    if not args.no_scaling:
+        workloads += scaling_workloads(quick=args.quick)
+
+    results = run_benchmarks(workloads, benches=args.bench, repeats=args.repeats)
+    save(args.out, results)
+    print(f'results: {args.out}')
+
+    if args.baseline:
+        regressions = compare(results, load(args.baseline), tolerance=args.tolerance)
+        for ri in regressions:
+            print(f"REGRESSION {ri['bench']} {ri['params']} {ri['metric']}: {ri['baseline']:.4g} -> {ri['current']:.4g} (x{ri['ratio']:.2f})")
+        if regressions:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
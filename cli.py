@@ -0,0 +1,81 @@
+"""
+Command line entry point, one subcommand per job:
+    python cli.py run [settings ...] [--no-plot] [--index N]   builds one at a time, see main.py
+    python cli.py sweep [settings ...] [--workers N] ...       builds on a process pool, see schedule.py
+    python cli.py plot RESULTS ...                             figures of results files or artifacts
+    python cli.py bench [--quick] ...                          benchmarks, see bench.py
+
+Each subcommand imports its module only when it runs. Computing never
+imports matplotlib or networkx, so a compute only task starts about as
+fast as numpy imports, e.g. for job arrays of many short builds:
+    python cli.py run --no-plot --index $SLURM_ARRAY_TASK_ID
+    python cli.py plot ./results/*.results.jsonl
+"""
+import argparse
+import sys
+
+
+def run(argv):
+    from main import main
+    main(argv)
+
+
+def sweep(argv):
+    from schedule import main
+    main(argv)
+
+
+def bench(argv):
+    from bench import main
+    main(argv)
+
+
+def plot(argv):
+    parser = argparse.ArgumentParser(prog='cli.py plot', description='Draw the pareto curves and trees of results files.')
+    parser.add_argument('results', nargs='+', help='.jsonl results files (see pareto/sink.py) or artifact folders (see pareto/artifact.py)')
+    parser.add_argument('--no-trees', action='store_true', help='only the pareto curves')
+    parser.add_argument('--workers', type=int, default=2, help='render processes, 0 draws in process')
+    args = parser.parse_args(argv)
+
+    from itertools import chain
+    from pareto.render import Renderer
+    from pareto.scheduler import group_results
+    from pareto.sink import read_results
+    from pareto.artifact import is_artifact, load_artifact
+    from main import tree_fname, report_front
+
+    def read(path):
+        if not is_artifact(path):
+            return read_results(path)
+        artifact = load_artifact(path)
+        return [{
+            'name': artifact.meta['name'],
+            'beta': artifact.meta['beta'],
+            'tree': artifact.tree(),
+            'value': artifact.value
+        }]
+
+    grouped = group_results(chain.from_iterable(read(path) for path in args.results))
+    with Renderer(workers=args.workers) as renderer:
+        for name, values in grouped.items():
+            report_front(name, values)
+            renderer.pareto(f'./figures/{name}.pcurve.png', values)
+            if args.no_trees:
+                continue
+            for vi in values:
+                renderer.tree(tree_fname(name, vi['beta']), vi['tree'], title=f"{name} - {vi['beta']:.2}")
+
+
+COMMANDS = {'run': run, 'sweep': sweep, 'plot': plot, 'bench': bench}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pareto optimal root structures.')
+    parser.add_argument('command', choices=list(COMMANDS), help='run, sweep, plot or bench. "cli.py COMMAND -h" for its options')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    COMMANDS[args.command](args.args)
+
+
+if __name__ == '__main__':
+    main()
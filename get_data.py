@@ -8,16 +8,32 @@ def get_data():
 
 # replace this when ready
 def get_real_data(segment_length=10):
-    data = []
-    tm = [str, int, float, float]
-    with open('./data/data.csv') as f:
-        data = [line.strip().replace('\n', '').split(',') for i, line in enumerate(f) if i]
-        data = [[fi(di) for di, fi in zip(row, tm)] for row in data]
-    
-    return [{
-        'name': f"{row[0]}-{row[1]}",
-        "length": row[2],
-        "n_segments": segment_length if segment_length else row[3]
-    } for row in data]
-    
+    return list(iter_real_data(segment_length=segment_length))
+
+
+def iter_real_data(source='./data/data.csv', segment_length=10):
+    """
+    Yield data instances one csv line at a time, so memory stays flat no
+    matter how many instances the file holds.
 
+    Parameters:
+        source: string - path of the csv, or any iterable of csv lines
+                (an open file, a stream, ...). The first line is a header.
+        segment_length: see get_real_data
+    """
+    if isinstance(source, str):
+        with open(source) as f:
+            yield from iter_real_data(f, segment_length)
+        return
+
+    tm = [str, int, float, float]
+    for i, line in enumerate(source):
+        line = line.strip()
+        if not i or not line:
+            continue
+        row = [fi(di) for di, fi in zip(line.split(','), tm)]
+        yield {
+            'name': f"{row[0]}-{row[1]}",
+            "length": row[2],
+            "n_segments": segment_length if segment_length else row[3]
+        }
@@ -1,10 +1,17 @@
+import argparse
 import numpy as np
-import sys
+import os
+from itertools import islice
 from pareto.Pareto import Pareto
+from pareto.cache import ResultCache, build_key
+from pareto.front import non_dominated, hypervolume, value_points
 from pareto.grid import get_grid
-from pareto.plot_pareto import plot_pareto, plot_tree
+from pareto.render import Renderer
+from pareto.sink import ResultSink, index_results, read_result
+from pareto.scheduler import iter_tasks, run_task
+from pareto.sweep import sweep_beta
 import json
-from get_data import get_data
+from get_data import get_data, iter_real_data
 
 
 def get_experiment_settings(json_settings_file="./settings/defaults.json"):
@@ -15,8 +22,9 @@ def get_experiment_settings(json_settings_file="./settings/defaults.json"):
 
 
     Parameters: 
-        json_settings_file: {unit_length: float, radius: float}
+        json_settings_file: {unit_length: float, radius: float, directions: int - optional}
         * see settings/default.json for example
+        * directions switches to the branching growth mode, see pareto/branch.py
 
     Returns
 
@@ -30,10 +38,18 @@ def get_experiment_settings(json_settings_file="./settings/defaults.json"):
     return {
         'unit_length': s['unit_length'],
         'radius': s['radius'],
-        'key': s['key'] if 'key' in s else ''
+        'key': s['key'] if 'key' in s else '',
+        'directions': s.get('directions')
     }
 
-def build_pareto(data_instance, settings):
+def get_betas(step=.2):
+    """
+    Values of beta the pareto curve is computed for. beta = 0 is skipped.
+    """
+    return [float(beta) for beta in np.arange(0, 1, step) if beta]
+
+
+def build_pareto(data_instance, settings, cache=None, sink=None, previous=None, checkpoints=None, artifacts=None):
     """
     Build the pareto curve. Computes coverage, transport objectives over a
     range of beta values.
@@ -43,10 +59,23 @@ def build_pareto(data_instance, settings):
             name: string,
             n_segments: int
             length: float
+        cache: ResultCache - optional, see pareto/cache.py
+        sink: ResultSink - optional, each beta is appended to it as soon
+              as it is built, see pareto/sink.py
+        previous: {beta: {beta, tree, value, key}} - optional results of an
+                  earlier run, a beta is not rebuilt when its key is the
+                  build key of this run (same inputs and code, see
+                  pareto/cache.py)
+        checkpoints: string - optional folder the builds checkpoint to, see
+                     pareto/checkpoint.py
+        artifacts: string - optional folder each build writes its artifact
+                   to, see pareto/artifact.py
     
     Returns:
-        [{beta, tree, grid, value}, ....]
+        [{beta, tree, grid, value, on_front}, ....]
         - value = {coverage, transport, beta}
+        - on_front = False when another beta's structure is at least as
+          good in both objectives, see pareto/front.py
     """
     di = data_instance 
     name = di['name']
@@ -57,25 +86,38 @@ def build_pareto(data_instance, settings):
 
     optimal_structures = []
 
-    for beta in np.arange(0, 1, .2):
-        beta = float(beta)
-        
-        if not beta: 
-            continue
-        
+    for beta in get_betas():
+        checkpoint = os.path.join(checkpoints, f"{name}_{beta:.2}.ckpt.npz") if checkpoints else None
+        artifact = os.path.join(artifacts, f"{name}_{beta:.2}") if artifacts else None
         pareto = Pareto(
             name, 
             beta, 
             segment_length,
             n_segments,
             settings['radius'],
-            unit_length=settings["unit_length"]
+            unit_length=settings["unit_length"],
+            directions=settings.get('directions'),
+            checkpoint=checkpoint,
+            artifact=artifact
         )
 
         # update grid here
         # pareto.set_grid(grid)
 
-        tree, grid, value = pareto.build()
+        key = build_key(pareto)
+        if previous and beta in previous and previous[beta].get('key') == key:
+            vi = previous[beta]
+            optimal_structures.append({
+                'beta': beta,
+                'tree': vi['tree'],
+                'grid': vi.get('grid'),
+                'value': vi['value']
+            })
+            continue
+
+        tree, grid, value = pareto.build(cache=cache, key=key)
+        if sink:
+            sink.write(name, beta, tree, value, key)
         optimal_structures.append({
             'beta': beta, 
             'tree': tree, 
@@ -83,30 +125,163 @@ def build_pareto(data_instance, settings):
             'value': value
         })
 
+    mark_front(optimal_structures)
     return optimal_structures
 
 
-def main():
-    settings_file = sys.argv[1] if len(sys.argv) > 1 else None 
-    settings_file = settings_file or './settings/default.json' 
-    settings = get_experiment_settings(settings_file)
-
-    data = get_data()
-    for i, di in enumerate(data):
-        # update the name to include the experimental details
-        name = di['name']
-        name = f"{name}-{settings['key']}"
-        print(f'running: {name}')
-        di['name'] = name
-        values = build_pareto(di, settings)
-        plot_pareto(f'./figures/{name}.pcurve.png', values)
-
-        for vi in values:
-            tree = vi['tree']
-            beta = vi['beta']
-            tname = f"./tree_pngs/{name}_{beta:.2}.tree.png"
-            plot_tree(tname, tree, title=f"{name} - {beta:.2}")
-        
+def mark_front(values):
+    """
+    Set on_front on every build result [{value}, ....]. Returns the hypervolume of the front.
+    """
+    points = value_points(values)
+    for vi, on_front in zip(values, non_dominated(points).tolist()):
+        vi['on_front'] = on_front
+    return hypervolume(points)
+
+
+def report_front(name, values):
+    hv = mark_front(values)
+    n_front = sum(vi['on_front'] for vi in values)
+    betas = ', '.join(f"{vi['beta']:.2}" for vi in values if vi['on_front'])
+    print(f"front: {name} - {n_front} of {len(values)} on the front (beta {betas}), hypervolume {hv:.6g}")
+
+
+def build_pareto_sweep(data_instance, settings):
+    """
+    Same as build_pareto, but follows the greedy build over every beta in
+    (0, 1] at once and returns each distinct tree exactly once.
+
+    Returns:
+        [{beta_interval, beta, tree, grid, value}, ....]
+        - beta_interval = (lo, hi) the tree is optimal for, beta its midpoint
+    """
+    di = data_instance
+    n_segments = di['n_segments']
+    pareto = Pareto(
+        di['name'],
+        None,
+        di['length'] / n_segments,
+        n_segments,
+        settings['radius'],
+        unit_length=settings["unit_length"]
+    )
+    return sweep_beta(pareto)
+
+
+def tree_fname(name, beta):
+    return f"./tree_pngs/{name}_{beta:.2}.tree.png"
+
+
+def plot_results(name, values, renderer=None):
+    """
+    Write the pareto curve and one tree png per beta for a data instance.
+
+    Parameters:
+        name: string
+        values: [{beta, tree, grid, value}, ....] - see build_pareto
+        renderer: Renderer - draw on its background pool. Drawn in process
+                  when None.
+    """
+    if renderer is None:
+        renderer = Renderer(workers=0)
+    renderer.pareto(f'./figures/{name}.pcurve.png', values)
+
+    for vi in values:
+        tree = vi['tree']
+        beta = vi['beta']
+        renderer.tree(tree_fname(name, beta), tree, title=f"{name} - {beta:.2}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Build the pareto curve of every data instance, one build at a time.')
+    parser.add_argument('settings', nargs='*', help='settings json files. Defaults to ./settings/default.json')
+    parser.add_argument('--real', action='store_true', help='stream instances from ./data/data.csv instead of get_data()')
+    parser.add_argument('--instance', default=None, help='only build the data instance of this name')
+    parser.add_argument('--index', type=int, default=None, help='only run the index-th settings x instance x beta build, e.g. a job array task id')
+    parser.add_argument('--results', default=None, help='.jsonl results file. Defaults to ./results/{key}.results.jsonl, or one file per build with --index')
+    parser.add_argument('--checkpoints', default='./checkpoints', help='folder builds checkpoint to')
+    parser.add_argument('--cache', default=None, help='folder of the build cache. Builds are not cached without it.')
+    parser.add_argument('--artifacts', default=None, help='folder every build writes its binary artifact to, see pareto/artifact.py')
+    parser.add_argument('--no-plot', action='store_true', help='only write numeric results. matplotlib is never imported.')
+    parser.add_argument('--fresh', action='store_true', help='rebuild every beta and start the results file over instead of reusing it')
+    return parser.parse_args(argv)
+
+
+def load_data(args):
+    data = iter_real_data() if args.real else get_data()
+    if args.instance:
+        data = (di for di in data if di['name'] == args.instance)
+    return data
+
+
+def run_index(args, settings_list):
+    """
+    Run the args.index-th build of settings x data x betas on its own, for
+    job arrays where every array task is one build.
+    """
+    tasks = iter_tasks(
+        settings_list, load_data(args), get_betas(),
+        cache=args.cache, checkpoints=args.checkpoints, artifacts=args.artifacts
+    )
+    task = next(islice(tasks, args.index, None), None)
+    if task is None:
+        raise SystemExit(f"--index {args.index} is past the last build")
+    print(f"running: {task['name']} - {task['beta']:.2}")
+    ri = run_task(task)
+    # one file per build, array tasks never append to the same file
+    results_fname = args.results or f"./results/{task['name']}_{task['beta']:.2}.results.jsonl"
+    with ResultSink(results_fname, open_with="w") as sink:
+        sink.write(ri['name'], ri['beta'], ri['tree'], ri['value'], ri['key'])
+    if not args.no_plot:
+        with Renderer(workers=0) as renderer:
+            renderer.tree(tree_fname(ri['name'], ri['beta']), ri['tree'], title=f"{ri['name']} - {ri['beta']:.2}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings_files = args.settings or ['./settings/default.json']
+    settings_list = [get_experiment_settings(fi) for fi in settings_files]
+    if args.index is not None:
+        run_index(args, settings_list)
+        return
+
+    cache = ResultCache(args.cache) if args.cache else None
+    for settings in settings_list:
+        # figures are drawn in the background while the next instance builds,
+        # results are streamed to the sink as each beta finishes. A rerun picks
+        # up where the last one stopped: betas already in the results with the
+        # same build key are reused and an interrupted build resumes from its
+        # checkpoint. --fresh starts over
+        results_fname = args.results or f"./results/{settings['key'] or 'default'}.results.jsonl"
+        # only where each earlier build is, so memory stays flat however
+        # long the results file gets. An instance reads back its own betas
+        index = {}
+        if os.path.exists(results_fname) and not args.fresh:
+            index = index_results(results_fname)
+        renderer = None if args.no_plot else Renderer()
+        try:
+            with ResultSink(results_fname, open_with="w" if args.fresh else "a") as sink:
+                for di in load_data(args):
+                    # update the name to include the experimental details
+                    name = f"{di['name']}-{settings['key']}"
+                    print(f'running: {name}')
+                    di = dict(di, name=name)
+                    previous = {
+                        beta: read_result(results_fname, offset)
+                        for beta, (_, offset) in index.pop(name, {}).items()
+                    }
+                    values = build_pareto(
+                        di, settings, cache=cache, sink=sink,
+                        previous=previous, checkpoints=args.checkpoints,
+                        artifacts=args.artifacts
+                    )
+                    report_front(name, values)
+                    if renderer:
+                        plot_results(name, values, renderer)
+        finally:
+            if renderer:
+                renderer.close()
+
 
 
 
@@ -1,10 +1,16 @@
-from pareto.grid import get_grid, grid_is_valid
+from pareto.grid import Grid, get_grid, grid_is_valid, as_grid
+from pareto.tiled import TiledGrid
 import numpy as np
-import networkx as nx
-import copy
-from pareto.pareto_objective import pareto_objective
-from uuid import uuid4
-from pareto.log import getLogger 
+from pareto.pareto_objective import ObjectiveState
+from pareto.log import getLogger, INFO
+from pareto.cache import cached_build, build_key
+from pareto.checkpoint import Checkpointer, load_checkpoint
+from pareto.tree import Tree
+from pareto.beam import beam_search
+from pareto.branch import grow_branching
+from pareto.ensemble import build_ensemble
+from pareto.artifact import Trajectory, write_artifact
+from pareto.instrument import Instrumentation, NULL
 
 
 
@@ -18,6 +24,30 @@ class Pareto:
     n_segments: int number of segments to add to the tree
     radius: given a node in the tree, a distance to look around for nutrients
     unit_length: length of a grid cell. 
+    log_fname: path of the log file, defaults to ./logs/{name}.pareto.log
+    log_level: level of the log, see log.py. DEBUG also logs every move scored.
+    log_records: also write per-iteration records to {log_fname}.jsonl
+    instrument: record per-phase timers and work counters, see instrument.py.
+                The totals are added to the returned value under 'instrumentation'.
+    tile_size: if set, use a TiledGrid (see tiled.py) over the same cells that
+               only allocates the tiles the tree reaches
+    spatial_index: look nutrients up in a bucketed index (see spatial.py)
+                   instead of scanning each disk. Pays off when only a few
+                   percent of the cells hold a nutrient. Dense grids only.
+    availability_index: count the nutrients of a candidate's disk from
+                        per-row Fenwick trees (see fenwick.py) instead of
+                        testing every cell. Pays off for a large radius
+                        relative to unit_length. Dense grids only.
+    directions: if set, build() grows from any node of the tree in this
+                many directions (or a list of (dx, dy)), see branch.py.
+                Otherwise only the last node grows left, right or bottom.
+    checkpoint: path of a .npz checkpoint of the greedy build, see
+                checkpoint.py. A build resumes from it when it exists and
+                was taken from the same inputs. It is removed once the
+                build finishes.
+    checkpoint_every: iterations between checkpoints
+    artifact: folder build() writes the artifact of the build to - tree,
+              final owners and per-iteration trajectory, see artifact.py
 
     In addition to setting parameters the function also creates 
     grid: a valid grid described by grid.py 
@@ -29,7 +59,18 @@ class Pareto:
         segment_length, 
         n_segments,
         radius,
-        unit_length=1        
+        unit_length=1,
+        log_fname=None,
+        log_level=INFO,
+        log_records=False,
+        instrument=False,
+        tile_size=None,
+        spatial_index=False,
+        availability_index=False,
+        directions=None,
+        checkpoint=None,
+        checkpoint_every=10,
+        artifact=None
     ):
         self.name = name
         self.segment_length = segment_length
@@ -39,15 +80,27 @@ class Pareto:
         self.beta = beta
         self.grid_width = 2 * n_segments  * segment_length
         self.grid_height = self.grid_width
-        self.logging = getLogger(f'./logs/{self.name}.pareto.log')
+        self.log_fname = log_fname if log_fname else f'./logs/{self.name}.pareto.log'
+        self.logging = getLogger(self.log_fname, level=log_level, records=log_records)
+        self.instrument = Instrumentation() if instrument else NULL
+        self.spatial_index = spatial_index
+        self.availability_index = availability_index
+        self.directions = directions
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.artifact = artifact
+        # per-iteration record of the last greedy or branching build, see artifact.py
+        self.trajectory = None
+        # cache.build_key of the current build, hashed once per build
+        self.key = None
         self.log_params()
 
-        self.grid = get_grid(self.grid_width, self.grid_height, unit_length)
+        if tile_size:
+            self.grid = TiledGrid.like(self.grid_width, self.grid_height, unit_length, tile_size)
+        else:
+            self.grid = get_grid(self.grid_width, self.grid_height, unit_length)
         if not grid_is_valid(self.grid):
             raise Exception('Invalid grid: On initialization')
-        for row in self.grid:
-            for cell in row:
-                cell['aquired_by_segment_id'] = None
 
         self.best_grid = None
         self.best_tree = None
@@ -55,13 +108,17 @@ class Pareto:
     def set_grid(self, grid):
         """
         Default grid is uniform nutrients, but that can be replaced 
-        before building with this call.
+        before building with this call. Accepts a Grid, a TiledGrid,
+        the legacy list-of-dicts format, or a nutrient map as a .npy path
+        (memory mapped) or a SharedMapHandle (see shared.py). Nutrient maps
+        are not copied, each build allocates its own state on first write.
         """
-        self.grid = grid
+        self.grid = as_grid(grid)
         return self
     
     def get_grid(self):
-        return copy.deepcopy(self.grid)
+        self.instrument.count('bytes_copied', self.grid.nbytes)
+        return self.grid.copy()
 
     
     def set_radius(self, radius):
@@ -75,7 +132,7 @@ class Pareto:
     def log_params(self):
         def l(var): 
             val = getattr(self,  var)
-            self.logging.info(f"{var}: {val}")
+            self.logging.info("%s: %s", var, val)
         l("name") 
         l("beta")
         l("segment_length") 
@@ -88,113 +145,253 @@ class Pareto:
 
     
 
+    def moves(self, prev):
+        """
+        Candidate coordinates for the next node: left, right and bottom of prev.
+        """
+        prev_x = prev[0]
+        prev_y = prev[1]
+        segment_length = self.segment_length
+        return [
+            (prev_x - segment_length, prev_y),
+            (prev_x + segment_length, prev_y),
+            (prev_x, prev_y + segment_length)
+        ]
+
+    def new_state(self, root=(0, 0)):
+        """
+        Objective state for an empty tree, on a copy of the grid.
+        """
+        return ObjectiveState(
+            self.get_grid(), self.beta, self.radius, self.unit_length, self.grid_width, self.grid_height, root,
+            instrument=self.instrument, spatial_index=self.spatial_index,
+            availability_index=self.availability_index
+        )
+
     def build_optimal_structure(self):
         """"
         Runs the algorithm. Builds the tree, calls the objective functions,
         and finds the best structure at each iteration. 
 
         Returns:
-            tree - optimal tree
+            tree - optimal tree, a Tree (see tree.py)
             grid - the final grid
             value - final values
                 - [{beta, coverage, transport}, ....]
         """
-        beta = self.beta
-        segment_length = self.segment_length
         n_segments = self.n_segments
-        grid = self.get_grid()
-        radius = self.radius
-        grid_width = self.grid_width 
-        grid_height = self.grid_height
-        unit_length = self.unit_length
+        instrument = self.instrument
 
-        tree = nx.DiGraph()
         root = (0, 0)
-        
-        # build the tree - a unique node id is required
-        tree.add_node(root, id="#root")
         prev = root
+        prev_id = 0
         best_pval = 0 # pareto value {beta, coverage, transport}
+        start = 0
+
+        # one working grid per build, candidates are scored against it without copies.
+        # the state also holds the tree, node ids are integers in insertion order
+        checkpointer, resumed = self.open_checkpoint()
+        if resumed:
+            state, start, prev, prev_id, best_pval, trajectory = resumed
+            self.logging.info("resumed from checkpoint %s at i=%s", self.checkpoint, start)
+        else:
+            state = self.new_state(root)
+            trajectory = Trajectory(n_segments)
+        tree = state.tree
         
-        for i in range(n_segments):
+        for i in range(start, n_segments):
             # 1) get previous node
-            # 2) build trees
-            # 3) compute objective for each tree
-            # 4) find best, set variables 
-
-            # 1
-            prev_x = prev[0]
-            prev_y = prev[1] 
-
-            # 2 - build trees
-            left_tree = copy.deepcopy(tree)
-            left_coord = (prev_x - segment_length, prev_y)
-            left_tree.add_node(left_coord, id=str(uuid4()))
-            left_tree.add_edge(prev, left_coord, id=str(uuid4()))
-            
-            right_tree = copy.deepcopy(tree)
-            right_coord = (prev_x + segment_length, prev_y)
-            right_tree.add_node(right_coord, id=str(uuid4()))
-            right_tree.add_edge(prev, right_coord, id=str(uuid4()))
-
-            bottom_tree = copy.deepcopy(tree)
-            bottom_coord = (prev_x, prev_y + segment_length)
-            bottom_tree.add_node(bottom_coord, id=str(uuid4()))
-            bottom_tree.add_edge(prev, bottom_coord, id=str(uuid4()))
-
-            # 3 - arrange data and compute objective
-            coords = [
-                left_coord, 
-                right_coord, 
-                bottom_coord
-            ]
-            trees = [
-                left_tree, 
-                right_tree, 
-                bottom_tree
-            ] 
-            grids = [
-                self.get_grid(),
-                self.get_grid(),
-                self.get_grid()
-            ]
-
-            # Boom
-            pvals = [
-                pareto_objective(trees[0], grids[0], beta, radius, unit_length, grid_width, grid_height),
-                pareto_objective(trees[1], grids[1], beta, radius, unit_length, grid_width, grid_height),
-                pareto_objective(trees[2], grids[2], beta, radius, unit_length, grid_width, grid_height)
-            ]
+            # 2) build candidate moves
+            # 3) score each move against the shared state
+            # 4) find best, commit it
+
+            # 1, 2 - candidate moves
+            node_id = i + 1
+            coords = self.moves(prev)
+
+            # 3 - Boom
+            pvals = state.scores(prev_id, coords)
+            self.logging.debug("scored moves: %s", pvals)
             
-            # find the index of best pareto value. Use index to get all values of interest.
+            # 4 - find the index of best pareto value. Use index to get all values of interest.
             vals = [pi['value'] for pi in pvals]
             best_value = max(vals)
             best_index = vals.index(best_value)
             
-            tree = trees[best_index]
-            best_pval = pvals[best_index]
-            prev = coords[best_index]
-            grid = grids[best_index]
+            coord = coords[best_index]
+            best_pval = state.commit(prev_id, coord, node_id)
+            trajectory.record(i, best_index, prev_id, coord, best_pval)
+            prev = coord
+            prev_id = node_id
             
-            if not grid_is_valid(grid):
-                self.logging.error(f"Invalid grid: {grid}")
-                raise Exception('Cannot set grid. Invalid')
-            
-            self.logging.info(f"Loop for i in n_segments: i={i}")
-            self.logging.info(f"best_index: {best_index}")
-            self.logging.info(f"len(tree): {tree.number_of_nodes()}")
-            self.logging.info(f"coord({prev[0]}, {prev[1]})")
-            self.logging.info(f"coverage: {best_pval['coverage']}")
-            self.logging.info(f"transport: {best_pval['transport']}")
-            self.logging.info(f"")
+            instrument.iteration(
+                i=i,
+                tree_size=len(tree),
+                coverage=best_pval['coverage'],
+                transport=best_pval['transport']
+            )
+
+            with instrument.phase('logging'):
+                self.logging.info("Loop for i in n_segments: i=%s", i)
+                self.logging.info("best_index: %s", best_index)
+                self.logging.info("len(tree): %s", len(tree))
+                self.logging.info("coord(%s, %s)", prev[0], prev[1])
+                self.logging.info("coverage: %s", best_pval['coverage'])
+                self.logging.info("transport: %s", best_pval['transport'])
+                self.logging.info("")
+                self.logging.record(
+                    i=i,
+                    best_index=best_index,
+                    coord=prev,
+                    coverage=best_pval['coverage'],
+                    transport=best_pval['transport']
+                )
+
+            if checkpointer and checkpointer.due(i) and i + 1 < n_segments:
+                with instrument.phase('checkpoint'):
+                    checkpointer.save(self.snapshot(state, i + 1, prev, prev_id, best_pval, trajectory))
+
+        with instrument.phase('grid_is_valid'):
+            valid = grid_is_valid(state.grid)
+        if not valid:
+            self.logging.error("Invalid grid: %s", state.grid)
+            raise Exception('Cannot set grid. Invalid')
+
+        with instrument.phase('logging'):
+            self.logging.flush()
+
+        if checkpointer:
+            checkpointer.discard()
+
+        if instrument.enabled:
+            best_pval['instrumentation'] = instrument.totals()
 
-        return tree, self.grid, best_pval
+        self.trajectory = trajectory
+        return tree, state.grid, best_pval
 
     
-    def build(self):
-        if not self.grid:
+    def open_checkpoint(self):
+        """
+        Returns:
+            checkpointer - a Checkpointer, None when checkpoints are off
+            resumed - (state, start, prev, prev_id, best_pval, trajectory) of
+                      the last checkpoint of this build, None to start from scratch
+        """
+        if not self.checkpoint:
+            return None, None
+        if not isinstance(self.grid, Grid):
+            self.logging.warning("checkpoints skipped: only dense grids are checkpointed")
+            return None, None
+
+        if self.key is None:
+            self.key = build_key(self)
+        checkpointer = Checkpointer(self.checkpoint, self.checkpoint_every)
+        snapshot = load_checkpoint(self.checkpoint, self.key)
+        if snapshot is None:
+            return checkpointer, None
+
+        grid = self.get_grid()
+        grid.available[...] = snapshot['available']
+        grid.owner[...] = snapshot['owner']
+        tree = Tree.from_arrays(snapshot['coords'], snapshot['parents'])
+        state = ObjectiveState.restore(
+            grid, tree, self.beta, self.radius, self.unit_length, self.grid_width, self.grid_height,
+            instrument=self.instrument, spatial_index=self.spatial_index,
+            availability_index=self.availability_index
+        )
+        trajectory = Trajectory(self.n_segments, snapshot['trajectory'])
+        resumed = (state, snapshot['i'], snapshot['prev'], snapshot['prev_id'], snapshot['best_pval'], trajectory)
+        return checkpointer, resumed
+
+    def snapshot(self, state, i, prev, prev_id, best_pval, trajectory):
+        """
+        Copy of everything needed to resume the greedy build at iteration i.
+        """
+        arrays = state.tree.to_arrays()
+        return {
+            'key': self.key,
+            'i': i,
+            'prev': list(prev),
+            'prev_id': prev_id,
+            'best_pval': best_pval,
+            'coords': arrays['coords'],
+            'parents': arrays['parents'],
+            'available': state.grid.available.copy(),
+            'owner': state.grid.owner.copy(),
+            'trajectory': trajectory.array.copy()
+        }
+
+    def build_beam(self, width=3, depth=1):
+        """
+        Beam search instead of the greedy build, see beam.py. width=1 and
+        depth=1 give the same tree as build_optimal_structure.
+
+        Returns:
+            tree, grid, value - as build_optimal_structure
+        """
+        return beam_search(self, width, depth)
+
+    def build_branching(self, directions=8):
+        """
+        Grow from any node of the tree in the given directions, see branch.py.
+
+        Returns:
+            tree, grid, value - as build_optimal_structure
+        """
+        return grow_branching(self, directions)
+
+    def build_ensemble(self, nutrients, grids=True):
+        """
+        Greedy build on every nutrient field of an ensemble at once, in
+        lockstep, see ensemble.py. The grid of this Pareto is not used.
+
+        Returns:
+            {trees, grids, values, stats}
+        """
+        return build_ensemble(self, nutrients, grids)
+
+    def build(self, cache=None, key=None):
+        """
+        Build the optimal structure. With a ResultCache (see cache.py) a
+        previous build with the same inputs is loaded instead.
+
+        key: cache.build_key of this build when the caller already has it,
+             so it isn't hashed again
+        """
+        self.key = key
+        if cache is not None:
+            return cached_build(self, cache, key)
+        if self.grid is None:
             raise Exception('Grid not set. Please set the grid before running. LINK TO GRID FILE')
         if not grid_is_valid(self.grid):
             
             raise Exception('Invalid grid: Muse set valid grid before building. Lin 13-')
-        return self.build_optimal_structure()
\ No newline at end of file
+        if self.directions:
+            return self.finish(*self.build_branching(self.directions))
+        return self.finish(*self.build_optimal_structure())
+
+    def finish(self, tree, grid, value):
+        """
+        Keep the result of a build and write its artifact when one is asked for.
+        A bounded tiled grid is written as the dense grid of its bounds.
+        """
+        self.best_tree = tree
+        self.best_grid = grid
+        if self.artifact:
+            if isinstance(grid, TiledGrid) and grid.bounds is None:
+                self.logging.warning("artifact skipped: unbounded tiled grids have no dense owner raster")
+            else:
+                dense = grid.to_grid() if isinstance(grid, TiledGrid) else grid
+                write_artifact(self.artifact, tree, dense, value, self.trajectory, meta=self.artifact_meta())
+        return tree, grid, value
+
+    def artifact_meta(self):
+        return {
+            'name': self.name,
+            'beta': self.beta,
+            'segment_length': self.segment_length,
+            'n_segments': self.n_segments,
+            'radius': self.radius,
+            'unit_length': self.unit_length,
+            'directions': self.directions
+        }
\ No newline at end of file
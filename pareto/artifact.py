@@ -0,0 +1,139 @@
+"""
+Artifact:
+    Compact binary record of one build, for analysis and plots without
+    rerunning it or parsing its log. An artifact is a folder of .npy files
+    that load memory mapped:
+        coords.npy: (n, 2) float64 - node coordinates, see Tree.to_arrays
+        parents.npy: (n,) int64 - parent ids, NO_PARENT for the root
+        owner.npy: (n_rows, n_cols) int32 - id of the node that acquired
+                   each cell of the final grid, NO_OWNER otherwise
+        trajectory.npy: (n_segments,) TRAJECTORY_DTYPE - one row per iteration
+        meta.json: {name, beta, segment_length, n_segments, radius,
+                    unit_length, directions, value}
+
+    The folder is written under a temp name and renamed into place, so a
+    reader never sees half an artifact.
+
+Trajectory:
+    Per-iteration record of a build, one structured row per node added:
+        choice: index of the move taken - 0 left, 1 right, 2 bottom for
+                the greedy build, the direction for branching growth
+        parent: id of the node it was attached to
+        x, y: coordinate of the node
+        coverage, transport, value: objectives after adding it
+"""
+import json
+import os
+import shutil
+import numpy as np
+from pareto.tree import Tree
+
+TRAJECTORY_DTYPE = np.dtype([
+    ('choice', np.int32),
+    ('parent', np.int32),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('coverage', np.int64),
+    ('transport', np.float64),
+    ('value', np.float64)
+])
+
+
+class Trajectory:
+    """
+    n: int - number of iterations, rows are preallocated
+    rows: optional TRAJECTORY_DTYPE array of iterations already run, e.g.
+          from a checkpoint
+    """
+    def __init__(self, n, rows=None):
+        self.rows = np.zeros(n, dtype=TRAJECTORY_DTYPE)
+        self.n = 0
+        if rows is not None:
+            self.n = len(rows)
+            self.rows[:self.n] = rows
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def array(self):
+        return self.rows[:self.n]
+
+    def record(self, i, choice, parent_id, coord, pval):
+        self.rows[i] = (choice, parent_id, coord[0], coord[1], pval['coverage'], pval['transport'], pval['value'])
+        self.n = i + 1
+
+
+class Artifact:
+    """
+    A loaded artifact, see load_artifact. The arrays are memory mapped
+    unless it was loaded with mmap=False.
+    """
+    def __init__(self, path, meta, coords, parents, owner, trajectory):
+        self.path = path
+        self.meta = meta
+        self.coords = coords
+        self.parents = parents
+        self.owner = owner
+        self.trajectory = trajectory
+
+    @property
+    def value(self):
+        return self.meta['value']
+
+    def tree(self):
+        return Tree.from_arrays(self.coords, self.parents)
+
+
+def write_artifact(path, tree, grid, value, trajectory=None, meta=None):
+    """
+    Write the artifact of a build to the folder path, replacing any artifact there.
+
+    Parameters:
+        tree: Tree
+        grid: Grid - the final grid
+        value: {beta, coverage, transport, value}
+        trajectory: Trajectory or TRAJECTORY_DTYPE array - optional
+        meta: dict - build parameters stored in meta.json with the value
+    """
+    if isinstance(trajectory, Trajectory):
+        trajectory = trajectory.array
+    if trajectory is None:
+        trajectory = np.zeros(0, dtype=TRAJECTORY_DTYPE)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    arrays = tree.to_arrays()
+    np.save(os.path.join(tmp, 'coords.npy'), arrays['coords'])
+    np.save(os.path.join(tmp, 'parents.npy'), arrays['parents'])
+    np.save(os.path.join(tmp, 'owner.npy'), np.ascontiguousarray(grid.owner))
+    np.save(os.path.join(tmp, 'trajectory.npy'), np.asarray(trajectory, dtype=TRAJECTORY_DTYPE))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(dict(meta or {}, value=value), f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+
+
+def load_artifact(path, mmap=True):
+    """
+    Artifact in the folder path. With mmap the arrays are read only memory
+    maps, so only the parts used are read from disk.
+    """
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = [
+        np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in ['coords', 'parents', 'owner', 'trajectory']
+    ]
+    return Artifact(path, meta, *arrays)
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, 'meta.json'))
@@ -0,0 +1,192 @@
+"""
+Beam:
+    Beam search over the moves of build_optimal_structure. Each step every
+    beam is expanded by every move, each expansion is scored by the best
+    value reachable within `depth` moves (k-step lookahead), and the
+    `width` best expansions are kept.
+
+    Beams share structure instead of copying it:
+        - a beam is a BeamNode, a persistent parent-pointer chain, so beams
+          with a common prefix share those nodes
+        - each BeamNode stores only the cells its node acquired, a diff
+          against its parent
+        - one working grid is moved between beams by undoing diffs up to
+          the common ancestor and replaying them down to the target
+
+    Memory and time per step grow with width x moves x r^2, not with the
+    grid size. With width=1 and depth=1 the result is the greedy build.
+"""
+from pareto.coverage import CoverageEngine
+from pareto.transport import distance
+from pareto.tree import Tree
+
+
+class BeamNode:
+    """
+    One node of a beam's tree, and the state of the beam ending there.
+
+    parent: BeamNode - None for the root
+    coord: (float, float)
+    node_id: int - also the depth in the tree
+    cells: (ii, jj) - cells acquired by this node
+    root_distance: float
+    coverage: int - of the tree ending at this node
+    transport: float - of the tree ending at this node
+    """
+    __slots__ = ('parent', 'coord', 'node_id', 'cells', 'root_distance', 'coverage', 'transport')
+
+    def __init__(self, parent, coord, node_id, cells, root_distance, coverage, transport):
+        self.parent = parent
+        self.coord = coord
+        self.node_id = node_id
+        self.cells = cells
+        self.root_distance = root_distance
+        self.coverage = coverage
+        self.transport = transport
+
+    def path(self):
+        """
+        Nodes from the root to this node.
+        """
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+
+class BeamSearch:
+    """
+    pareto: Pareto - parameters, grid and moves of the build
+    width: int - number of beams kept per step
+    depth: int - moves looked ahead when scoring an expansion
+    """
+    def __init__(self, pareto, width=3, depth=1):
+        if width < 1 or depth < 1:
+            raise ValueError(f"width and depth must be >= 1, got {width}, {depth}")
+        self.pareto = pareto
+        self.width = width
+        self.depth = depth
+        self.beta = pareto.beta
+        self.engine = CoverageEngine(
+            pareto.get_grid(), pareto.radius, pareto.unit_length, pareto.grid_width, pareto.grid_height,
+            pareto.instrument, pareto.spatial_index, pareto.availability_index
+        )
+        root = (0, 0)
+        cells = self.engine.acquire(root, 0)
+        self.root = BeamNode(None, root, 0, cells, 0, len(cells[0]), 0)
+        self.current = self.root
+
+    def value(self, cval, tval):
+        return self.beta * cval + (1 - self.beta) * tval
+
+    def checkout(self, target):
+        """
+        Move the working grid to the state of target.
+        """
+        a, b = self.current, target
+        undo, redo = [], []
+        while a.node_id > b.node_id:
+            undo.append(a)
+            a = a.parent
+        while b.node_id > a.node_id:
+            redo.append(b)
+            b = b.parent
+        while a is not b:
+            undo.append(a)
+            redo.append(b)
+            a, b = a.parent, b.parent
+
+        for node in undo:
+            self.engine.release(*node.cells)
+        for node in reversed(redo):
+            self.engine.take(*node.cells, node.node_id)
+        self.current = target
+
+    def lookahead(self, coord, root_distance, cval, tval, node_id, depth):
+        """
+        Best value reachable from the working grid within depth more moves.
+        The working grid is restored before returning.
+        """
+        if depth == 0:
+            return self.value(cval, tval)
+        best = None
+        for move in self.pareto.moves(coord):
+            move_distance = root_distance + distance(coord, move)
+            ii, jj = self.engine.acquire(move, node_id)
+            gain = len(ii)
+            val = self.lookahead(move, move_distance, cval + gain, tval + gain * move_distance, node_id + 1, depth - 1)
+            self.engine.release(ii, jj)
+            best = val if best is None else max(best, val)
+        return best
+
+    def expand(self, beam, remaining):
+        """
+        Score every move from beam.
+
+        Returns:
+            [(score, value, child), ....] in move order
+        """
+        self.checkout(beam)
+        node_id = beam.node_id + 1
+        depth = min(self.depth, remaining) - 1
+        expansions = []
+        for move in self.pareto.moves(beam.coord):
+            root_distance = beam.root_distance + distance(beam.coord, move)
+            ii, jj = self.engine.acquire(move, node_id)
+            gain = len(ii)
+            cval = beam.coverage + gain
+            tval = beam.transport + gain * root_distance
+            score = self.lookahead(move, root_distance, cval, tval, node_id + 1, depth)
+            self.engine.release(ii, jj)
+            child = BeamNode(beam, move, node_id, (ii, jj), root_distance, cval, tval)
+            expansions.append((score, self.value(cval, tval), child))
+        return expansions
+
+    def run(self):
+        """
+        Returns:
+            best BeamNode after n_segments moves
+        """
+        n_segments = self.pareto.n_segments
+        beams = [self.root]
+        for i in range(n_segments):
+            expansions = []
+            for beam in beams:
+                expansions += self.expand(beam, n_segments - i)
+            # stable sort: ties keep beam rank, then move order, like the greedy build
+            expansions.sort(key=lambda e: (-e[0], -e[1]))
+            beams = [child for _, _, child in expansions[:self.width]]
+
+            best = beams[0]
+            self.pareto.logging.info(
+                "beam i=%s: best coord(%s, %s) coverage: %s transport: %s",
+                i, best.coord[0], best.coord[1], best.coverage, best.transport
+            )
+
+        return max(beams, key=lambda beam: self.value(beam.coverage, beam.transport))
+
+
+def beam_search(pareto, width=3, depth=1):
+    """
+    Build pareto's structure with beam search.
+
+    Returns:
+        tree - Tree of the best beam
+        grid - the final grid of the best beam
+        value - {beta, coverage, transport, value}
+    """
+    search = BeamSearch(pareto, width, depth)
+    best = search.run()
+    search.checkout(best)
+
+    nodes = best.path()
+    path = [(parent.node_id, node.coord, node.node_id) for parent, node in zip(nodes[:-1], nodes[1:])]
+    pareto.logging.flush()
+    return Tree.from_path(path, search.root.coord), search.engine.grid, {
+        'beta': search.beta,
+        'coverage': best.coverage,
+        'transport': best.transport,
+        'value': search.value(best.coverage, best.transport)
+    }
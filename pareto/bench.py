@@ -0,0 +1,277 @@
+"""
+Bench:
+    Timings of the hot paths and of the full build, swept over the problem
+    size. Every benchmark records
+        wall: best wall time in seconds over the repeats
+        peak_bytes: peak memory allocated by python (tracemalloc) during one run
+        calls: call counts of the hot functions during one run
+
+    The standard workloads are get_data() x settings A/B/C. The scaling
+    sweeps vary n_segments, grid size (length / unit_length) and radius.
+
+    Results are JSON:
+        {meta: {...}, results: [{bench, params, wall, peak_bytes, calls}, ....]}
+    and compare() flags regressions against a stored baseline.
+"""
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pareto import coverage as coverage_module
+from pareto.Pareto import Pareto
+from pareto.coverage import CoverageEngine, coverage, get_candidates
+from pareto.pareto_objective import ObjectiveState
+from pareto.transport import TransportEngine, transport
+
+# (owner, attribute) of the functions whose calls are counted
+COUNTED = {
+    'disk_indices': (coverage_module, 'disk_indices'),
+    'coverage_gain': (CoverageEngine, 'gain'),
+    'coverage_gains': (CoverageEngine, 'gains'),
+    'coverage_add': (CoverageEngine, 'add'),
+    'transport_delta': (TransportEngine, 'delta'),
+    'transport_acquire': (TransportEngine, 'acquire'),
+    'score': (ObjectiveState, 'score'),
+    'scores': (ObjectiveState, 'scores'),
+    'commit': (ObjectiveState, 'commit')
+}
+
+
+@contextmanager
+def count_calls(counted=COUNTED):
+    """
+    Temporarily wrap the counted functions. Yields {name: count}.
+    """
+    counts = {name: 0 for name in counted}
+    originals = {}
+
+    def wrap(name, func):
+        def counted_func(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+        return counted_func
+
+    for name, (owner, attr) in counted.items():
+        originals[name] = getattr(owner, attr)
+        setattr(owner, attr, wrap(name, originals[name]))
+    try:
+        yield counts
+    finally:
+        for name, (owner, attr) in counted.items():
+            setattr(owner, attr, originals[name])
+
+
+def measure(func, repeats=3):
+    """
+    Run func repeats times for the wall time, then once more under
+    tracemalloc and the call counters.
+
+    Returns:
+        {wall, peak_bytes, calls}
+    """
+    walls = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        walls.append(time.perf_counter() - start)
+
+    with count_calls() as calls:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'wall': min(walls),
+        'peak_bytes': peak,
+        'calls': {name: n for name, n in calls.items() if n}
+    }
+
+
+def make_pareto(length, n_segments, radius, unit_length, beta=.6):
+    return Pareto(
+        'bench',
+        beta,
+        length / n_segments,
+        n_segments,
+        radius,
+        unit_length=unit_length,
+        log_fname=os.devnull
+    )
+
+
+def bench_build(params, repeats):
+    """
+    End to end Pareto.build.
+    """
+    pareto = make_pareto(**params)
+    return measure(pareto.build, repeats)
+
+
+def bench_get_candidates(params, repeats, n_points=1000):
+    pareto = make_pareto(**params)
+    rng = random.Random(0)
+    points = [
+        (rng.uniform(0, pareto.grid_width), rng.uniform(0, pareto.grid_height))
+        for _ in range(n_points)
+    ]
+
+    def run():
+        for point in points:
+            get_candidates(point, pareto.radius, pareto.unit_length, pareto.grid_width, pareto.grid_height)
+    return measure(run, repeats)
+
+
+def bench_coverage(params, repeats):
+    """
+    Full (non incremental) coverage of a built tree.
+    """
+    pareto = make_pareto(**params)
+    tree, _, _ = pareto.build()
+
+    def run():
+        coverage(tree, pareto.get_grid(), pareto.radius, pareto.unit_length, pareto.grid_width, pareto.grid_height)
+    return measure(run, repeats)
+
+
+def bench_transport(params, repeats):
+    """
+    Full (non incremental) transport of a built tree.
+    """
+    pareto = make_pareto(**params)
+    tree, _, _ = pareto.build()
+    grid = pareto.get_grid()
+    coverage(tree, grid, pareto.radius, pareto.unit_length, pareto.grid_width, pareto.grid_height)
+
+    def run():
+        transport(tree, grid)
+    return measure(run, repeats)
+
+
+BENCHES = {
+    'build': bench_build,
+    'get_candidates': bench_get_candidates,
+    'coverage': bench_coverage,
+    'transport': bench_transport
+}
+
+
+def standard_workloads(data, settings_list):
+    """
+    Data instances x settings as benchmark params, e.g. get_data() x settings A/B/C.
+    """
+    return [{
+        'length': di['length'],
+        'n_segments': di['n_segments'],
+        'radius': si['radius'],
+        'unit_length': si['unit_length']
+    } for si in settings_list for di in data]
+
+
+def scaling_workloads(quick=False):
+    """
+    Sweeps of n_segments, grid size and radius around dataA-settingsA.
+    """
+    base = {'length': 100, 'n_segments': 20, 'radius': 10, 'unit_length': 1}
+    n_segments = [10, 20, 40] if quick else [10, 20, 40, 80, 160]
+    lengths = [50, 100, 200] if quick else [50, 100, 200, 400, 800]
+    radii = [2, 5, 10] if quick else [2, 5, 10, 20, 40]
+
+    workloads = []
+    # fixed segment length, more segments
+    workloads += [dict(base, n_segments=n, length=5 * n) for n in n_segments]
+    # fixed number of segments, larger grid
+    workloads += [dict(base, length=length) for length in lengths]
+    workloads += [dict(base, radius=radius) for radius in radii]
+    return workloads
+
+
+def run_benchmarks(workloads, benches=None, repeats=3, verbose=True):
+    """
+    Run every bench on every workload.
+
+    Returns:
+        {meta, results}
+    """
+    benches = benches or list(BENCHES)
+    results = []
+    seen = set()
+    for params in workloads:
+        key = json.dumps(params, sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        for name in benches:
+            result = {'bench': name, 'params': params}
+            result.update(BENCHES[name](params, repeats))
+            results.append(result)
+            if verbose:
+                print(f"{name} {params}: {result['wall']:.4f}s {result['peak_bytes'] / 2**20:.1f}MiB")
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeats': repeats
+        },
+        'results': results
+    }
+
+
+def result_key(result):
+    return result['bench'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(current, baseline, tolerance=.2, min_wall=1e-3):
+    """
+    Compare two benchmark runs.
+
+    Parameters:
+        current: {meta, results}
+        baseline: {meta, results}
+        tolerance: float - relative slowdown / memory growth that counts as a regression
+        min_wall: float - wall times below this are too noisy to flag
+
+    Returns:
+        [{bench, params, metric, baseline, current, ratio}, ....] - the regressions
+    """
+    base = {result_key(ri): ri for ri in baseline['results']}
+    regressions = []
+    for ri in current['results']:
+        bi = base.get(result_key(ri))
+        if bi is None:
+            continue
+        for metric in ['wall', 'peak_bytes']:
+            if metric == 'wall' and max(ri[metric], bi[metric]) < min_wall:
+                continue
+            if not bi[metric]:
+                continue
+            ratio = ri[metric] / bi[metric]
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    'bench': ri['bench'],
+                    'params': ri['params'],
+                    'metric': metric,
+                    'baseline': bi[metric],
+                    'current': ri[metric],
+                    'ratio': ratio
+                })
+    return regressions
+
+
+def save(fname, results):
+    folder = os.path.dirname(fname)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(fname, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load(fname):
+    with open(fname) as f:
+        return json.load(f)
@@ -0,0 +1,141 @@
+"""
+Branch:
+    Growth mode where every node of the tree is an attachment point. Each
+    step the candidates are every (node, direction) pair, n x k of them,
+    and the best is added, so the result is a branching root system
+    instead of a path.
+
+    Candidates are scored in batches:
+        - a candidate's coordinate and root distance never change, so they
+          are stored once in arrays when its node is added
+        - its gain only changes when a new node acquires cells in its disk,
+          i.e. when the new node lies within 2 * radius of it. Only those
+          stale candidates and the new node's own are re-scored, with one
+          batched CoverageEngine.gains call
+        - the value of every candidate is then one vectorized expression
+
+    directions: int n for n evenly spaced angles starting along +x (4 gives
+    left, right, up and down, 8 adds the diagonals), or an explicit list of
+    (dx, dy) unit vectors.
+"""
+import math
+import numpy as np
+from pareto.artifact import Trajectory
+
+
+def as_directions(directions):
+    """
+    (k, 2) array of unit vectors.
+    """
+    if isinstance(directions, int):
+        if directions < 1:
+            raise ValueError(f"directions must be >= 1, got {directions}")
+        angles = 2 * math.pi * np.arange(directions) / directions
+        # exact zeros and ones for the axis directions
+        return np.round(np.stack([np.cos(angles), np.sin(angles)], axis=1), 12)
+    return np.asarray(directions, dtype=np.float64).reshape(-1, 2)
+
+
+class BranchGrowth:
+    """
+    pareto: Pareto - parameters and grid of the build
+    directions: int or [(dx, dy), ...] - see module docstring
+    """
+    def __init__(self, pareto, directions=8):
+        self.pareto = pareto
+        self.beta = pareto.beta
+        self.steps = as_directions(directions) * pareto.segment_length
+        self.root = (0, 0)
+        self.state = pareto.new_state(self.root)
+        # a new node's disk can only overlap candidate disks within this distance
+        self.reach = 2 * pareto.radius + pareto.unit_length
+
+        # one row per candidate
+        self.points = np.empty((0, 2), dtype=np.float64)
+        self.parents = np.empty(0, dtype=np.intp)
+        self.root_distance = np.empty(0, dtype=np.float64)
+        self.gains = np.empty(0, dtype=np.int64)
+        self.add_candidates(0, self.root)
+        self.trajectory = Trajectory(pareto.n_segments)
+
+    def add_candidates(self, node_id, coord):
+        points = np.asarray(coord, dtype=np.float64) + self.steps
+        parents = np.full(len(points), node_id, dtype=np.intp)
+        root_distance = self.state.transport.distances_to(parents, points)
+        self.points = np.concatenate([self.points, points])
+        self.parents = np.concatenate([self.parents, parents])
+        self.root_distance = np.concatenate([self.root_distance, root_distance])
+        self.gains = np.concatenate([self.gains, self.state.coverage.gains(points)])
+
+    def refresh(self, coord):
+        """
+        Re-score the candidates whose disk may overlap the disk of a node just added at coord.
+        """
+        d = self.points - np.asarray(coord, dtype=np.float64)
+        stale = np.flatnonzero(np.sqrt((d ** 2).sum(axis=1)) <= self.reach)
+        if len(stale):
+            self.gains[stale] = self.state.coverage.gains(self.points[stale])
+
+    def values(self):
+        coverage = self.state.coverage.total
+        transport = self.state.transport.total
+        cvals = coverage + self.gains
+        tvals = transport + self.gains * self.root_distance
+        return self.beta * cvals + (1 - self.beta) * tvals
+
+    def step(self, node_id):
+        """
+        Add the best candidate as node_id. Ties go to the lowest parent id,
+        then to direction order.
+
+        Returns:
+            (parent_id, direction, coord, pval) - direction indexes the directions
+        """
+        best = int(np.argmax(self.values()))
+        # every node adds one candidate per direction, in direction order
+        direction = best % len(self.steps)
+        parent_id = int(self.parents[best])
+        x, y = self.points[best].tolist()
+        coord = (x, y)
+        pval = self.state.commit(parent_id, coord, node_id)
+        self.refresh(coord)
+        self.add_candidates(node_id, coord)
+        return parent_id, direction, coord, pval
+
+    def run(self):
+        pareto = self.pareto
+        instrument = pareto.instrument
+        pval = self.state.pval(self.state.coverage.total, self.state.transport.total)
+        for i in range(pareto.n_segments):
+            parent_id, direction, coord, pval = self.step(i + 1)
+            self.trajectory.record(i, direction, parent_id, coord, pval)
+            instrument.iteration(
+                i=i,
+                tree_size=len(self.state.tree),
+                candidates=len(self.points),
+                coverage=pval['coverage'],
+                transport=pval['transport']
+            )
+            pareto.logging.info(
+                "branch i=%s: parent %s coord(%s, %s) coverage: %s transport: %s",
+                i, parent_id, coord[0], coord[1], pval['coverage'], pval['transport']
+            )
+        return pval
+
+
+def grow_branching(pareto, directions=8):
+    """
+    Build pareto's structure by attaching each new node to any node of the tree.
+
+    Returns:
+        tree - Tree, see tree.py
+        grid - the final grid
+        value - {beta, coverage, transport, value}
+    """
+    growth = BranchGrowth(pareto, directions)
+    value = growth.run()
+    pareto.trajectory = growth.trajectory
+    pareto.logging.flush()
+    if pareto.instrument.enabled:
+        value['instrumentation'] = pareto.instrument.totals()
+    return growth.state.tree, growth.state.grid, value
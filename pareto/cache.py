@@ -0,0 +1,201 @@
+"""
+Cache:
+    Content addressed on-disk cache of Pareto builds. The key is a hash of
+    everything the build depends on:
+        segment_length, n_segments - the data parameters (not the name)
+        radius, unit_length, beta
+        the grid contents
+        a code version stamp - CACHE_VERSION plus the source of the modules
+                               that compute the build
+
+    Each entry is one compressed .npz file holding the tree (coords and
+    parents, see tree.py), the final grid, the objective values and the
+    trajectory of the build (see artifact.py). The cache is bounded by size and evicts the
+    least recently used entries first.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from functools import lru_cache
+from pareto.grid import Grid
+from pareto.tree import Tree, as_tree
+from pareto.artifact import Trajectory
+
+# bump to invalidate every entry written by older code
+CACHE_VERSION = 3
+
+_BUILD_MODULES = [
+    'Pareto.py', 'grid.py', 'coverage.py', 'transport.py', 'pareto_objective.py', 'tree.py', 'branch.py',
+    'spatial.py', 'fenwick.py', 'artifact.py'
+]
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Stamp of the code that produces a build.
+    """
+    h = hashlib.sha256(str(CACHE_VERSION).encode())
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for fname in _BUILD_MODULES:
+        with open(os.path.join(folder, fname), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _directions_param(directions):
+    if directions is None or isinstance(directions, int):
+        return directions
+    return np.asarray(directions, dtype=np.float64).tolist()
+
+
+def build_key(pareto):
+    """
+    Hash of the inputs of pareto.build(). A pristine grid (see grid.py) is
+    hashed as a marker instead of its state, so hashing never allocates it.
+    """
+    params = {
+        'segment_length': pareto.segment_length,
+        'n_segments': pareto.n_segments,
+        'radius': pareto.radius,
+        'unit_length': pareto.unit_length,
+        'beta': pareto.beta,
+        'grid_width': pareto.grid_width,
+        'grid_height': pareto.grid_height,
+        'directions': _directions_param(pareto.directions),
+        'code_version': code_version()
+    }
+    h = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    grid = pareto.grid
+    h.update(str(grid.shape).encode())
+    h.update(np.ascontiguousarray(grid.nutrient).tobytes())
+    if grid.pristine:
+        h.update(b'pristine')
+    else:
+        h.update(grid.available.tobytes())
+        h.update(grid.owner.tobytes())
+    return h.hexdigest()
+
+
+def tree_to_arrays(tree):
+    """
+    {coords, parents} of a Tree or an nx tree, see Tree.to_arrays.
+    """
+    return as_tree(tree).to_arrays()
+
+
+def arrays_to_tree(coords, parents):
+    return Tree.from_arrays(coords, parents)
+
+
+class ResultCache:
+    """
+    folder: string - where entries are stored
+    max_bytes: int - total size of the cache, least recently used entries
+               are evicted past it
+    """
+    def __init__(self, folder='./cache', max_bytes=512 * 2**20):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Returns (tree, grid, value, trajectory) or None on a miss.
+        """
+        fname = self.path(key)
+        try:
+            with np.load(fname) as data:
+                tree = arrays_to_tree(data['coords'], data['parents'])
+                grid = Grid(data['nutrient'], data['available'], data['owner'])
+                value = json.loads(str(data['value']))
+                trajectory = data['trajectory'] if 'trajectory' in data else None
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(fname)
+        return tree, grid, value, trajectory
+
+    def put(self, key, tree, grid, value, trajectory=None):
+        fname = self.path(key)
+        tmp = f"{fname}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(
+                f,
+                nutrient=grid.nutrient,
+                available=grid.available,
+                owner=grid.owner,
+                value=np.array(json.dumps(value)),
+                **({} if trajectory is None else {'trajectory': trajectory.array}),
+                **tree_to_arrays(tree)
+            )
+        os.replace(tmp, fname)
+        self.evict()
+
+    def entries(self):
+        """
+        [(path, size, mtime), ....] least recently used first.
+        """
+        entries = []
+        for fname in os.listdir(self.folder):
+            if not fname.endswith('.npz'):
+                continue
+            path = os.path.join(self.folder, fname)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def invalidate(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def cached_build(pareto, cache, key=None):
+    """
+    pareto.build() through the cache. Returns tree, grid, value.
+
+    key: build_key(pareto) when the caller already has it
+    """
+    if not isinstance(pareto.grid, Grid):
+        pareto.logging.warning("cache skipped: only dense grids are cached")
+        return pareto.build()
+    if key is None:
+        key = build_key(pareto)
+    hit = cache.get(key)
+    if hit is not None:
+        pareto.logging.info("cache hit: %s", key)
+        tree, grid, value, rows = hit
+        pareto.trajectory = None if rows is None else Trajectory(len(rows), rows)
+        return pareto.finish(tree, grid, value)
+    tree, grid, value = pareto.build(key=key)
+    cache.put(key, tree, grid, value, pareto.trajectory)
+    return tree, grid, value
@@ -0,0 +1,172 @@
+"""
+Checkpoint:
+    Periodic snapshots of a running build, so a killed job resumes from the
+    last snapshot instead of from scratch.
+
+        checkpointer = Checkpointer(fname, every=10)
+        ...
+        if checkpointer.due(i):
+            checkpointer.save(snapshot)   # cheap copies, returns at once
+        ...
+        checkpointer.discard()            # build finished
+
+    A snapshot is {key, i, prev, prev_id, best_pval, coords, parents,
+    available, owner, trajectory}:
+        key: cache.build_key of the build - a snapshot only resumes the
+             build it was taken from
+        i: next iteration to run
+        coords, parents: the tree, see Tree.to_arrays
+        available: bit packed, owner: int32 - the grid state
+        trajectory: the iterations run so far, see artifact.py
+
+    Snapshots are written by one background thread. Only the newest
+    pending snapshot is kept, so a slow disk never queues up copies or
+    blocks the build loop. Each write goes to a temp file that is then
+    renamed over the checkpoint, so a crash mid-write leaves the previous
+    checkpoint intact.
+
+Ledger:
+    At the sweep level the results stream (see sink.py) doubles as the
+    ledger of finished tasks: done_tasks reads the (name, beta) and build
+    key of every complete line. A task is only done when the key of the
+    build it would run is the stored one.
+"""
+import atexit
+import json
+import os
+import threading
+import numpy as np
+from pareto.sink import read_results
+
+
+class Checkpointer:
+    """
+    fname: string - the .npz checkpoint
+    every: int - save every this many iterations
+    """
+    def __init__(self, fname, every=10):
+        folder = os.path.dirname(fname)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.fname = fname
+        self.every = max(int(every), 1)
+        self.n_written = 0
+        self._pending = None
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='checkpoint', daemon=True)
+        self._thread.start()
+        # a build interrupted by an exception still gets its last snapshot written
+        atexit.register(self.close)
+
+    def due(self, i):
+        return (i + 1) % self.every == 0
+
+    def save(self, snapshot):
+        """
+        Queue a snapshot for writing, replacing one not written yet.
+        """
+        if self._error is not None:
+            raise self._error
+        with self._cond:
+            self._pending = snapshot
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                snapshot, self._pending = self._pending, None
+                if snapshot is None:
+                    return
+            try:
+                write_checkpoint(self.fname, snapshot)
+                self.n_written += 1
+            except Exception as e:
+                self._error = e
+
+    def close(self):
+        """
+        Write the pending snapshot and stop the writer.
+        """
+        atexit.unregister(self.close)
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def discard(self):
+        """
+        Stop the writer and remove the checkpoint, e.g. once the build is done.
+        """
+        with self._cond:
+            self._pending = None
+        self.close()
+        try:
+            os.remove(self.fname)
+        except FileNotFoundError:
+            pass
+
+
+def write_checkpoint(fname, snapshot):
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    meta = {key: snapshot[key] for key in ['key', 'i', 'prev', 'prev_id', 'best_pval']}
+    available = snapshot['available']
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(
+            f,
+            meta=np.array(json.dumps(meta)),
+            coords=snapshot['coords'],
+            parents=snapshot['parents'],
+            shape=np.array(available.shape),
+            available=np.packbits(available, axis=None),
+            owner=snapshot['owner'],
+            trajectory=snapshot['trajectory']
+        )
+    os.replace(tmp, fname)
+
+
+def load_checkpoint(fname, key=None):
+    """
+    Snapshot in fname, or None if there is none or it belongs to another
+    build (key differs).
+    """
+    try:
+        with np.load(fname) as data:
+            meta = json.loads(str(data['meta']))
+            if key is not None and meta['key'] != key:
+                return None
+            shape = tuple(data['shape'].tolist())
+            n = int(np.prod(shape))
+            snapshot = dict(meta)
+            snapshot.update({
+                'prev': tuple(meta['prev']),
+                'coords': data['coords'],
+                'parents': data['parents'],
+                'available': np.unpackbits(data['available'], count=n).astype(np.bool_).reshape(shape),
+                'owner': data['owner'],
+                'trajectory': data['trajectory']
+            })
+            return snapshot
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None
+
+
+def done_tasks(results_fname):
+    """
+    {(name, beta): key, ....} of the builds already in a results stream, the
+    last line of each wins. Lines written without a build key are not done.
+    """
+    done = {}
+    if not os.path.exists(results_fname):
+        return done
+    for ri in read_results(results_fname, trees=False):
+        if ri['key'] is None:
+            done.pop((ri['name'], ri['beta']), None)
+        else:
+            done[(ri['name'], ri['beta'])] = ri['key']
+    return done
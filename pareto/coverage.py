@@ -1,16 +1,107 @@
 
-import networkx as nx
 from random import randint
 import copy
 import math
 import numpy as np
+from functools import lru_cache
 from pareto.grid import grids_are_equal, grid_is_valid, grid_meta
 import math
 from pareto.log import getLogger 
+from pareto.instrument import NULL
+from pareto.tree import Tree
+from pareto.spatial import NutrientIndex
+from pareto.fenwick import AvailabilityIndex
 
 
 
 
+@lru_cache(maxsize=4096)
+def disk_stencil(radius, unit_length, offset):
+    """
+    Index offsets of every cell whose centre lies within radius of a point.
+    The disk only depends on where the point sits inside its own cell, so
+    it is computed once per (radius, unit_length, offset) and translated.
+
+    Parameters
+        radius: float
+        unit_length: float
+        offset: (float, float) - position of the point inside its cell, in [0, unit_length)
+
+    Returns
+        (di, dj) - read only int arrays, ordered by di then dj
+    """
+    fx, fy = offset
+    reach = int(math.ceil(radius / unit_length)) + 1
+    steps = np.arange(-reach, reach + 1)
+    di, dj = np.meshgrid(steps, steps, indexing='ij')
+
+    # distance from the cell centre to the point
+    dx = (di + 0.5) * unit_length - fx
+    dy = (dj + 0.5) * unit_length - fy
+    inside = np.sqrt(dx ** 2 + dy ** 2) <= radius
+
+    di = di[inside].astype(np.intp)
+    dj = dj[inside].astype(np.intp)
+    di.flags.writeable = False
+    dj.flags.writeable = False
+    return di, dj
+
+
+@lru_cache(maxsize=4096)
+def disk_spans(radius, unit_length, offset):
+    """
+    The disk of disk_stencil as one span of columns per row: the cells
+    (di[k], dj_lo[k]..dj_hi[k]) inclusive. A disk is convex, so the cells of
+    a row are contiguous.
+
+    Returns
+        (di, dj_lo, dj_hi) - read only int arrays, ordered by di
+    """
+    di, dj = disk_stencil(radius, unit_length, offset)
+    rows, starts = np.unique(di, return_index=True)
+    # the stencil is ordered by di then dj, a row ends where the next starts
+    ends = np.append(starts[1:], len(di))[:len(starts)] - 1
+    spans = (rows.astype(np.intp), dj[starts], dj[ends])
+    for arr in spans:
+        arr.flags.writeable = False
+    return spans
+
+
+def disk_indices(point, radius, unit_length):
+    """
+    Indices (ii, jj) of every cell within radius of point, not clipped.
+    """
+    x, y = point  # point coordinates in cm
+    base_i = math.floor(x / unit_length)
+    base_j = math.floor(y / unit_length)
+    offset = (x - base_i * unit_length, y - base_j * unit_length)
+
+    di, dj = disk_stencil(radius, unit_length, offset)
+    return di + base_i, dj + base_j
+
+
+def clip_indices(ii, jj, bounds):
+    """
+    Keep the indices inside bounds = (i_min, i_max, j_min, j_max), max exclusive.
+    """
+    i_min, i_max, j_min, j_max = bounds
+    inside = (ii >= i_min) & (ii < i_max) & (jj >= j_min) & (jj < j_max)
+    return ii[inside], jj[inside]
+
+
+def get_candidate_indices(point, radius, unit_length, grid_width, grid_height):
+    """
+    Vectorized get_candidates. Returns the indices as two arrays (ii, jj)
+    clipped to the grid.
+    """
+    num_cols = int(grid_width // unit_length)
+    num_rows = int(grid_height // unit_length)
+
+    ii, jj = disk_indices(point, radius, unit_length)
+    # clamp to grid dimensions
+    return clip_indices(ii, jj, (0, num_cols, 0, num_rows))
+
+
 def get_candidates(point, radius, unit_length, grid_width, grid_height):
     """
     Given a point corresponding to a tree node, find all indices in the grid
@@ -26,37 +117,214 @@ def get_candidates(point, radius, unit_length, grid_width, grid_height):
     Returns
         [(i, j), .....]
     """
-    num_cols = int(grid_width // unit_length)
-    num_rows = int(grid_height // unit_length)
-    
-    x, y = point  # point coordinates in cm
-    
-    # Determine the bounding indices (clamped to grid dimensions)
-    min_i = max(0, int((x - radius) // unit_length))
-    max_i = min(num_cols - 1, int((x + radius) // unit_length))
-    min_j = max(0, int((y - radius) // unit_length))
-    max_j = min(num_rows - 1, int((y + radius) // unit_length))
-    
-    cells = []
-    for i in range(min_i, max_i + 1):
-        for j in range(min_j, max_j + 1):
-            # Compute the center coordinates of cell (i, j)
-            center_x = i * unit_length + unit_length / 2
-            center_y = j * unit_length + unit_length / 2
-            
-            # Calculate the distance from the cell center to the given point.
-            dist = math.sqrt((center_x - x) ** 2 + (center_y - y) ** 2)
-            
-            if dist <= radius:
-                cells.append((i, j))
-                
-    return cells
+    ii, jj = get_candidate_indices(point, radius, unit_length, grid_width, grid_height)
+    return list(zip(ii.tolist(), jj.tolist()))
+
+
+class CoverageEngine:
+    """
+    Incremental coverage. Holds the grid of the committed tree so that a
+    candidate node is scored by looking only at the cells of its own disk,
+    O(r^2) per candidate instead of a BFS re-scan of the whole tree.
+
+    A node acquires every available nutrient in its disk that no earlier
+    node took. Adding nodes in id order therefore reproduces the ownership
+    of coverage() exactly, as builds add nodes in id order.
+
+    Params:
+        grid: a valid Grid or TiledGrid - updated in place as nodes are added
+        radius: float
+        unit_length: float
+        grid_width: float
+        grid_height: float
+        instrument: Instrumentation - optional, see instrument.py
+        spatial_index: bool - look nutrients up in a NutrientIndex (see
+                       spatial.py) instead of scanning every cell of the
+                       disk. Faster when nutrients are sparse, dense Grid only.
+        availability_index: bool - score candidates by counting the spans of
+                            their disk in an AvailabilityIndex (see
+                            fenwick.py) instead of testing every cell.
+                            Faster for a large radius, dense Grid only.
+    """
+    def __init__(
+        self, grid, radius, unit_length, grid_width, grid_height, instrument=NULL, spatial_index=False,
+        availability_index=False
+    ):
+        self.grid = grid
+        self.instrument = instrument
+        self.radius = radius
+        self.unit_length = unit_length
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.bounds = grid.index_bounds(grid_width, grid_height, unit_length)
+        self.index = None
+        if spatial_index:
+            # buckets about one disk wide, so a query reads a few buckets
+            bucket_size = max(int(math.ceil(radius / unit_length)), 4)
+            self.index = NutrientIndex.from_grid(grid, self.bounds, bucket_size)
+        self.availability = None
+        if availability_index:
+            self.availability = AvailabilityIndex.from_grid(grid, self.bounds)
+        self.total = 0
+
+    @classmethod
+    def from_tree(cls, tree, grid, radius, unit_length, grid_width, grid_height, root=(0, 0), instrument=NULL):
+        """
+        Engine with the nodes of tree committed. A Tree is replayed in id
+        order, the order its build acquired nutrients in. An nx tree is
+        replayed in bfs order from root, as coverage always has: a nutrient
+        in reach of two nodes goes to the one fewer edges from the root.
+        """
+        engine = cls(grid, radius, unit_length, grid_width, grid_height, instrument)
+        if isinstance(tree, Tree):
+            for node_id, coord in enumerate(tree.coords.tolist()):
+                engine.add(tuple(coord), node_id)
+            return engine
+        import networkx as nx
+        for ni in nx.bfs_tree(tree, root):
+            engine.add(ni, tree.nodes[ni]['id'])
+        return engine
+
+    def copy(self):
+        self.instrument.count('bytes_copied', self.grid.nbytes)
+        engine = CoverageEngine(
+            self.grid.copy(), self.radius, self.unit_length, self.grid_width, self.grid_height, self.instrument
+        )
+        engine.index = None if self.index is None else self.index.copy()
+        if self.availability is not None:
+            self.instrument.count('bytes_copied', self.availability.nbytes)
+            engine.availability = self.availability.copy()
+        engine.total = self.total
+        return engine
+
+    def _acquirable(self, point):
+        """
+        Indices of the cells in the disk around point holding an available nutrient.
+        """
+        instrument = self.instrument
+        if self.index is not None:
+            with instrument.phase('coverage'):
+                ii, jj, n_scanned = self.index.query(point, self.radius, self.unit_length)
+            instrument.count('cells_scanned', n_scanned)
+            return ii, jj
+        with instrument.phase('get_candidates'):
+            ii, jj = disk_indices(point, self.radius, self.unit_length)
+            if self.bounds is not None:
+                ii, jj = clip_indices(ii, jj, self.bounds)
+        with instrument.phase('coverage'):
+            acquired = self.grid.acquirable(ii, jj)
+            ii, jj = ii[acquired], jj[acquired]
+        instrument.count('cells_scanned', len(acquired))
+        return ii, jj
+
+    def gain(self, point):
+        """
+        Number of nutrients a node at point would acquire. Does not change state.
+        """
+        if self.availability is not None:
+            return int(self.gains([point])[0])
+        ii, _ = self._acquirable(point)
+        return len(ii)
 
+    def gains(self, points):
+        """
+        Batched gain: the number of nutrients a node at each of points would
+        acquire, as an int array. Does not change state.
 
+        Points are grouped by their offset inside their cell, so every group
+        shares one stencil and is looked up in the grid with one call.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        unit_length = self.unit_length
+        base = np.floor(points / unit_length)
+        offsets = (points - base * unit_length).tolist()
+        base = base.astype(np.intp)
 
+        groups = {}
+        for row, offset in enumerate(offsets):
+            groups.setdefault(tuple(offset), []).append(row)
 
+        out = np.zeros(len(points), dtype=np.int64)
+        instrument = self.instrument
+        for offset, rows in groups.items():
+            rows = np.array(rows, dtype=np.intp)
+            if self.availability is not None:
+                out[rows] = self._span_gains(base[rows], offset)
+                continue
+            with instrument.phase('get_candidates'):
+                di, dj = disk_stencil(self.radius, unit_length, offset)
+                ii = base[rows, 0, None] + di
+                jj = base[rows, 1, None] + dj
+                owners = np.broadcast_to(np.arange(len(rows))[:, None], ii.shape)
+                if self.bounds is not None:
+                    i_min, i_max, j_min, j_max = self.bounds
+                    inside = (ii >= i_min) & (ii < i_max) & (jj >= j_min) & (jj < j_max)
+                    ii, jj, owners = ii[inside], jj[inside], owners[inside]
+                else:
+                    ii, jj, owners = ii.ravel(), jj.ravel(), owners.ravel()
+            with instrument.phase('coverage'):
+                acquired = self.grid.acquirable(ii, jj)
+                out[rows] = np.bincount(owners[acquired], minlength=len(rows))
+            instrument.count('cells_scanned', len(ii))
+        return out
 
-def coverage(tree, grid, radius, unit_length, grid_width, grid_height):
+    def _span_gains(self, base, offset):
+        """
+        gains of the points in the cells base sharing one offset, counted
+        per row span in the availability index.
+        """
+        with self.instrument.phase('get_candidates'):
+            di, dj_lo, dj_hi = disk_spans(self.radius, self.unit_length, offset)
+            ii = base[:, 0, None] + di
+            lo = base[:, 1, None] + dj_lo
+            hi = base[:, 1, None] + dj_hi
+        with self.instrument.phase('coverage'):
+            counts = self.availability.count(ii.ravel(), lo.ravel(), hi.ravel())
+        self.instrument.count('spans_scanned', ii.size)
+        return counts.reshape(ii.shape).sum(axis=1)
+
+    def acquire(self, point, node_id):
+        """
+        Commit a node: acquire the nutrients in its disk. Returns the
+        indices (ii, jj) acquired, which can be undone with release.
+        """
+        ii, jj = self._acquirable(point)
+        self.take(ii, jj, node_id)
+        return ii, jj
+
+    def add(self, point, node_id):
+        """
+        Commit a node: acquire the nutrients in its disk. Returns the number acquired.
+        """
+        ii, _ = self.acquire(point, node_id)
+        return len(ii)
+
+    def take(self, ii, jj, node_id):
+        """
+        Mark cells as acquired by node_id, e.g. to replay a previous acquire.
+        """
+        with self.instrument.phase('coverage'):
+            self.grid.take(ii, jj, node_id)
+            if self.index is not None:
+                self.index.delete(ii, jj)
+            if self.availability is not None:
+                self.availability.update(ii, jj, -1)
+        self.total += len(ii)
+
+    def release(self, ii, jj):
+        """
+        Undo an acquire of the cells (ii, jj).
+        """
+        with self.instrument.phase('coverage'):
+            self.grid.release(ii, jj)
+            if self.index is not None:
+                self.index.insert(ii, jj)
+            if self.availability is not None:
+                self.availability.update(ii, jj, 1)
+        self.total -= len(ii)
+
+
+def coverage(tree, grid, radius, unit_length, grid_width, grid_height, instrument=NULL):
     """
     Coverage needs to return the number of nutrients. 
     It should take a grid of nutrients, and a radius r. 
@@ -66,40 +334,14 @@ def coverage(tree, grid, radius, unit_length, grid_width, grid_height):
     transport score can be computed.
 
     Params: 
-        tree: nx graph of the plant
-        grid: a grid of nutrients of the structure [[{nutrient: boolean, available: boolean}, ...]]
+        tree: Tree or nx graph of the plant. A Tree acquires nutrients in
+              id order, an nx graph in bfs order from the root
+        grid: a valid Grid as described in grid.py
             - nutrient: if a nutrient is at that location
             - available: if a nutrient is available and has not been used.
+            - owner: set to the node id for every nutrient acquired here.
         radius: distance 
     """
-    # orient the root of the tree to the top center index
-    n_rows = len(grid)
-    n_cols = len(grid[0])
-    curr_i = int(n_rows / 2)
-    curr_j = 0
-
-    root = (0, 0)
-    # iterate through the nodes and bfs order and compute the nutrients
-    nodes = nx.bfs_tree(tree, root)
-    nutrients = []
-    for i, ni in enumerate(nodes):
-        x = ni[0]
-        y = ni[1]
-        node_attr = tree.nodes[ni]
-        nid = node_attr['id']
-            
-        # get the nutrients asssociated with x, y and 
-        candidate_indices = get_candidates((x, y), radius, unit_length, grid_width, grid_height)
-        nutrients_this_iteration = []
-        for i, j in candidate_indices:
-
-            cell = grid[i][j]
-
-            if cell['nutrient'] and cell['available']:
-                nutrients_this_iteration.append(1)
-                cell['available'] = False
-                cell['acquired_by_node_id'] = nid
-                
-        nutrients.append(sum(nutrients_this_iteration))
-    
-    return sum(nutrients)
\ No newline at end of file
+    # replay the nodes through the engine, see CoverageEngine.from_tree
+    engine = CoverageEngine.from_tree(tree, grid, radius, unit_length, grid_width, grid_height, instrument=instrument)
+    return engine.total
@@ -0,0 +1,285 @@
+"""
+Ensemble:
+    The same greedy build (one data instance, one beta) over many nutrient
+    fields at once, e.g. random maps from a transform_func of get_grid.
+
+        nutrients = ensemble_nutrients(pareto, transform_func, n_members=200)
+        result = build_ensemble(pareto, nutrients)
+        result['stats']['coverage']['mean']
+
+    The N fields are stacked into one (N, n_rows, n_cols) mask of the
+    cells holding an available nutrient, and the N builds advance in
+    lockstep. Every
+    iteration scores the 3 moves of all N members with one batched disk
+    lookup over the ensemble axis, picks the best move per member with one
+    argmax and commits all N moves together. Each member gets exactly the
+    tree and value Pareto.build_optimal_structure gives on its own field.
+    The owner rasters are only filled in when the final grids are asked
+    for, from the cells each node acquired.
+
+    Only the greedy path build is batched, branching growth (directions)
+    and beam search are not.
+"""
+import numpy as np
+from pareto.coverage import disk_stencil
+from pareto.grid import Grid, as_grid, get_grid
+from pareto.tree import Tree
+
+
+def ensemble_nutrients(pareto, transform_func, n_members):
+    """
+    Grids of n_members calls to get_grid with transform_func, on pareto's
+    grid size. transform_func is called once per member, so a random
+    transform gives a different field each time.
+    """
+    return [
+        get_grid(pareto.grid_width, pareto.grid_height, pareto.unit_length, transform_func)
+        for _ in range(n_members)
+    ]
+
+
+def summary(values):
+    """
+    {mean, std, min, max, median, q05, q95} of an array of values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    q05, median, q95 = np.quantile(values, [.05, .5, .95]).tolist()
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'median': median,
+        'q05': q05,
+        'q95': q95
+    }
+
+
+class EnsembleBuild:
+    """
+    pareto: Pareto - parameters of the build, its own grid is not used
+    nutrients: (N, n_rows, n_cols) bool array, or a list of N grids of one
+               shape (Grid, nutrient map, legacy cells - see as_grid)
+    """
+    def __init__(self, pareto, nutrients):
+        if pareto.directions:
+            raise ValueError("Ensembles only batch the greedy path build, not branching growth")
+        self.pareto = pareto
+        self.beta = pareto.beta
+        self.radius = pareto.radius
+        self.unit_length = pareto.unit_length
+
+        self.grids0 = None
+        if isinstance(nutrients, np.ndarray):
+            nutrient = nutrients.astype(np.bool_, copy=False)
+            if nutrient.ndim == 2:
+                nutrient = nutrient[None]
+            self.open = nutrient.copy()
+        else:
+            grids = [as_grid(grid) for grid in nutrients]
+            if not all(isinstance(grid, Grid) for grid in grids):
+                raise ValueError("Ensembles need dense Grids")
+            shapes = {grid.shape for grid in grids}
+            if len(shapes) != 1:
+                raise ValueError(f"Every member needs the same grid shape, got {sorted(shapes)}")
+            nutrient = np.stack([grid.nutrient for grid in grids])
+            self.open = np.stack([
+                grid.nutrient if grid.pristine else grid.nutrient & grid.available for grid in grids
+            ])
+            self.grids0 = grids
+        if nutrient.ndim != 3 or not len(nutrient):
+            raise ValueError(f"nutrients must be (n_members, n_rows, n_cols), got shape {nutrient.shape}")
+        self.nutrient = nutrient
+        # (members, ii, jj) taken by each node, in id order
+        self.acquired = []
+        self.n_members = len(nutrient)
+        n_rows, n_cols = nutrient.shape[1:]
+        self.bounds = (
+            0, min(int(pareto.grid_width // self.unit_length), n_rows),
+            0, min(int(pareto.grid_height // self.unit_length), n_cols)
+        )
+
+        # every member grows a path, so parents and node ids are shared and
+        # only coordinates and root distances are per member
+        n_nodes = pareto.n_segments + 1
+        self.coords = np.zeros((self.n_members, n_nodes, 2), dtype=np.float64)
+        self.root_distance = np.zeros((self.n_members, n_nodes), dtype=np.float64)
+        self.coverage = np.zeros(self.n_members, dtype=np.int64)
+        self.transport = np.zeros(self.n_members, dtype=np.float64)
+        self.n = 1
+        self.acquire(self.coords[:, 0], 0)
+
+    def _disk_cells(self, points):
+        """
+        Cells (members, ii, jj, rows) inside the disk of each point, clipped
+        to the bounds, where point k belongs to member k % N.
+
+        Points are grouped by their offset inside their cell, so every
+        group shares one stencil, as in CoverageEngine.gains.
+        """
+        unit_length = self.unit_length
+        base = np.floor(points / unit_length)
+        offsets = (points - base * unit_length).tolist()
+        base = base.astype(np.intp)
+
+        groups = {}
+        for row, offset in enumerate(offsets):
+            groups.setdefault(tuple(offset), []).append(row)
+
+        i_min, i_max, j_min, j_max = self.bounds
+        cells = []
+        for offset, rows in groups.items():
+            rows = np.array(rows, dtype=np.intp)
+            di, dj = disk_stencil(self.radius, unit_length, offset)
+            ii = base[rows, 0, None] + di
+            jj = base[rows, 1, None] + dj
+            owners = np.broadcast_to(rows[:, None], ii.shape)
+            inside = (ii >= i_min) & (ii < i_max) & (jj >= j_min) & (jj < j_max)
+            ii, jj, owners = ii[inside], jj[inside], owners[inside]
+            cells.append((owners % self.n_members, ii, jj, owners))
+        return [np.concatenate(arrays) for arrays in zip(*cells)]
+
+    def gains(self, points):
+        """
+        Number of nutrients a node at each of points would acquire, point k
+        in member k % N. Does not change state.
+        """
+        members, ii, jj, rows = self._disk_cells(points)
+        acquired = self.open[members, ii, jj]
+        return np.bincount(rows[acquired], minlength=len(points))
+
+    def acquire(self, points, node_id):
+        """
+        Commit node_id at points, one per member: take the available
+        nutrients of its disk and add their transport.
+        """
+        members, ii, jj, _ = self._disk_cells(points)
+        acquired = self.open[members, ii, jj]
+        members, ii, jj = members[acquired], ii[acquired], jj[acquired]
+        self.open[members, ii, jj] = False
+        self.acquired.append((members, ii, jj))
+        gain = np.bincount(members, minlength=self.n_members)
+        self.coverage += gain
+        self.transport += gain * self.root_distance[:, node_id]
+
+    def moves(self, prev):
+        """
+        (N, 3, 2) candidate coordinates: left, right and bottom of each prev,
+        see Pareto.moves.
+        """
+        s = self.pareto.segment_length
+        x, y = prev[:, 0], prev[:, 1]
+        return np.stack([
+            np.stack([x - s, y], axis=1),
+            np.stack([x + s, y], axis=1),
+            np.stack([x, y + s], axis=1)
+        ], axis=1)
+
+    def step(self):
+        """
+        Add the next node of every member. Returns the best move index per member.
+        """
+        prev_id = self.n - 1
+        prev = self.coords[:, prev_id]
+        candidates = self.moves(prev)
+        n_moves = candidates.shape[1]
+        # move-major, so point k belongs to member k % N
+        points = candidates.transpose(1, 0, 2).reshape(-1, 2)
+        gains = self.gains(points).reshape(n_moves, self.n_members).T
+
+        d = candidates - prev[:, None]
+        root_distance = self.root_distance[:, prev_id, None] + np.sqrt(d[..., 0]**2 + d[..., 1]**2)
+        cvals = self.coverage[:, None] + gains
+        tvals = self.transport[:, None] + gains * root_distance
+        vals = self.beta * cvals + (1 - self.beta) * tvals
+        # ties go to the first move, as in the single build
+        best = np.argmax(vals, axis=1)
+
+        members = np.arange(self.n_members)
+        node_id = self.n
+        self.coords[:, node_id] = candidates[members, best]
+        self.root_distance[:, node_id] = root_distance[members, best]
+        self.n += 1
+        self.acquire(self.coords[:, node_id], node_id)
+        return best
+
+    def run(self):
+        pareto = self.pareto
+        for i in range(pareto.n_segments):
+            self.step()
+            pareto.logging.info(
+                "ensemble i=%s: coverage mean %s transport mean %s",
+                i, self.coverage.mean(), self.transport.mean()
+            )
+        pareto.logging.flush()
+        return self
+
+    def values(self):
+        """
+        [{beta, coverage, transport, value}, ....] of every member.
+        """
+        beta = self.beta
+        return [
+            {
+                'beta': beta,
+                'coverage': cval,
+                'transport': tval,
+                'value': beta * cval + (1 - beta) * tval
+            }
+            for cval, tval in zip(self.coverage.tolist(), self.transport.tolist())
+        ]
+
+    def trees(self):
+        # a path: node k hangs off k - 1 and the root off NO_PARENT
+        parents = np.arange(self.n) - 1
+        return [Tree.from_arrays(coords[:self.n], parents) for coords in self.coords]
+
+    def grids(self):
+        """
+        Final grid of every member: its starting grid with the cells each
+        node acquired taken by that node.
+        """
+        members, ii, jj = [np.concatenate(arrays) for arrays in zip(*self.acquired)]
+        node_ids = np.repeat(np.arange(len(self.acquired)), [len(cells[0]) for cells in self.acquired])
+        order = np.argsort(members, kind='stable')
+        splits = np.cumsum(np.bincount(members, minlength=self.n_members))[:-1]
+
+        grids = []
+        for m, cells in enumerate(zip(*[np.split(arr[order], splits) for arr in [ii, jj, node_ids]])):
+            grid = self.grids0[m].copy() if self.grids0 else Grid(self.nutrient[m])
+            ii_m, jj_m, node_ids_m = cells
+            grid.available[ii_m, jj_m] = False
+            grid.owner[ii_m, jj_m] = node_ids_m
+            grids.append(grid)
+        return grids
+
+    def stats(self):
+        values = self.values()
+        return {key: summary([vi[key] for vi in values]) for key in ['coverage', 'transport', 'value']}
+
+
+def build_ensemble(pareto, nutrients, grids=True):
+    """
+    Build pareto's greedy structure on every nutrient field of the ensemble.
+
+    Parameters:
+        pareto: Pareto
+        nutrients: (N, n_rows, n_cols) bool array or list of N grids, see
+                   ensemble_nutrients
+        grids: bool - also return the final grid of every member
+
+    Returns:
+        {trees, grids, values, stats}
+            trees: [Tree, ....] - one per member
+            grids: [Grid, ....] - final grids, None when grids=False
+            values: [{beta, coverage, transport, value}, ....]
+            stats: {coverage, transport, value} - each {mean, std, min,
+                   max, median, q05, q95} over the members
+    """
+    ensemble = EnsembleBuild(pareto, nutrients).run()
+    return {
+        'trees': ensemble.trees(),
+        'grids': ensemble.grids() if grids else None,
+        'values': ensemble.values(),
+        'stats': ensemble.stats()
+    }
@@ -0,0 +1,190 @@
+"""
+Front:
+    Pareto fronts of (coverage, transport) points. Builds maximize
+    beta * coverage + (1 - beta) * transport, so both objectives are
+    maximized by default. Pass maximize=(True, False) etc. for other senses.
+
+    A point is dominated when another is at least as good in both
+    objectives and better in one. Equal points don't dominate each other.
+
+        non_dominated(points) - mask of the front, O(n log n)
+        front_ranks(points) - non-dominated sorting: 0 for the front, 1 for
+                              the front of the rest, ..., O(n log n)
+        hypervolume(points, reference) - area dominated by the points and
+                                         bounded by the reference point
+        Front - a front kept up to date one point at a time, with its
+                hypervolume updated incrementally, for streams of results
+"""
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+OBJECTIVES = ('coverage', 'transport')
+
+
+def _oriented(points, maximize):
+    """
+    (n, 2) float array of points with every objective turned into one to maximize.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    signs = np.where(np.asarray(maximize, dtype=np.bool_), 1.0, -1.0)
+    return points * signs
+
+
+def _sorted_unique(points):
+    """
+    Distinct points by x then y, both descending, and the index of each
+    input point in them.
+    """
+    order = np.lexsort((-points[:, 1], -points[:, 0]))
+    ordered = points[order]
+    new = np.ones(len(ordered), dtype=np.bool_)
+    new[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+    inverse = np.empty(len(points), dtype=np.intp)
+    inverse[order] = np.cumsum(new) - 1
+    return ordered[new], inverse
+
+
+def non_dominated(points, maximize=(True, True)):
+    """
+    Boolean mask of the points on the Pareto front.
+    """
+    points = _oriented(points, maximize)
+    if not len(points):
+        return np.zeros(0, dtype=np.bool_)
+    unique, inverse = _sorted_unique(points)
+    # every earlier point has a larger x, or the same x and a larger y, so
+    # a point is dominated iff an earlier one has at least its y
+    best_before = np.maximum.accumulate(np.concatenate([[-np.inf], unique[:-1, 1]]))
+    return (unique[:, 1] > best_before)[inverse]
+
+
+def front_ranks(points, maximize=(True, True)):
+    """
+    Non-dominated sorting: the rank of every point, 0 for the front, 1 for
+    the front of the remaining points, and so on.
+    """
+    points = _oriented(points, maximize)
+    if not len(points):
+        return np.zeros(0, dtype=np.intp)
+    unique, inverse = _sorted_unique(points)
+    # points arrive in x descending order, so within one front y increases
+    # and a front's last y is its largest. Those last ys decrease from front
+    # to front, and a point joins the first front whose last y is below its own
+    last = []
+    ranks = np.empty(len(unique), dtype=np.intp)
+    for k, y in enumerate(unique[:, 1].tolist()):
+        # last is decreasing, search it negated
+        rank = bisect_right(last, -y)
+        if rank == len(last):
+            last.append(-y)
+        else:
+            last[rank] = -y
+        ranks[k] = rank
+    return ranks[inverse]
+
+
+def hypervolume(points, reference=(0, 0), maximize=(True, True)):
+    """
+    Area dominated by the points and dominating the reference point.
+    Points that don't dominate the reference add nothing.
+    """
+    points = _oriented(points, maximize)
+    ref_x, ref_y = _oriented(reference, maximize)[0].tolist()
+    front = points[non_dominated(points)]
+    if not len(front):
+        return 0.0
+    # x ascending, so y descending
+    front = _sorted_unique(front)[0][::-1]
+    x = np.maximum(front[:, 0], ref_x)
+    prev_x = np.maximum(np.concatenate([[ref_x], x[:-1]]), ref_x)
+    return float(((x - prev_x) * np.maximum(front[:, 1] - ref_y, 0)).sum())
+
+
+class Front:
+    """
+    Pareto front built one point at a time, e.g. while results stream in.
+    Adding a point is O(log n) plus the points it removes from the front
+    (and a list insert), and updates the hypervolume without recomputing it.
+
+    reference: (float, float) - reference point of the hypervolume
+    maximize: (bool, bool) - sense of each objective
+    """
+    def __init__(self, reference=(0, 0), maximize=(True, True)):
+        self.maximize = maximize
+        self.reference = _oriented(reference, maximize)[0].tolist()
+        # x ascending and y descending, oriented to maximize
+        self.xs = []
+        self.ys = []
+        self.items = []
+        self.hypervolume = 0.0
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _term(self, k, prev_x):
+        """
+        Hypervolume of point k right of prev_x.
+        """
+        ref_x, ref_y = self.reference
+        return max(self.xs[k] - max(prev_x, ref_x), 0) * max(self.ys[k] - ref_y, 0)
+
+    def _prev_x(self, k):
+        return self.xs[k - 1] if k > 0 else self.reference[0]
+
+    def add(self, point, item=None):
+        """
+        Add point, e.g. (coverage, transport), with an optional item such as
+        the build result. Returns True when it joined the front.
+        """
+        x, y = _oriented(point, self.maximize)[0].tolist()
+        i = bisect_left(self.xs, x)
+        # the points from i on have at least x, ys[i] is the largest of their ys
+        if i < len(self.xs) and self.ys[i] >= y:
+            return False
+
+        # the points with at most x and at most y are dominated by the new
+        # point, they end at index j - 1 and start where y drops to y or below
+        j = bisect_right(self.xs, x)
+        k = j
+        while k > 0 and self.ys[k - 1] <= y:
+            k -= 1
+
+        # terms k .. j-1 go, and the term of point j changes its left edge
+        old = sum(self._term(m, self._prev_x(m)) for m in range(k, j))
+        if j < len(self.xs):
+            old += self._term(j, self._prev_x(j))
+        prev_x = self._prev_x(k)
+        del self.xs[k:j], self.ys[k:j], self.items[k:j]
+        self.xs.insert(k, x)
+        self.ys.insert(k, y)
+        self.items.insert(k, item)
+        new = self._term(k, prev_x)
+        if k + 1 < len(self.xs):
+            new += self._term(k + 1, x)
+        self.hypervolume += new - old
+        return True
+
+    def points(self):
+        """
+        (n, 2) array of the front in its original sense, ordered by the first objective.
+        """
+        return _oriented(np.stack([self.xs, self.ys], axis=1) if self.xs else np.zeros((0, 2)), self.maximize)
+
+
+def value_points(values):
+    """
+    (n, 2) array of the (coverage, transport) of build results, see
+    main.build_pareto.
+    """
+    return np.array([[vi['value'][key] for key in OBJECTIVES] for vi in values], dtype=np.float64).reshape(-1, 2)
+
+
+def pareto_front(values):
+    """
+    The build results on the front, ordered by coverage.
+    """
+    values = list(values)
+    mask = non_dominated(value_points(values))
+    front = [vi for vi, on_front in zip(values, mask.tolist()) if on_front]
+    front.sort(key=lambda vi: vi['value']['coverage'])
+    return front
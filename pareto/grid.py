@@ -1,99 +1,364 @@
 """
 Grid:
-    grid = [[{nutrient: boolean, available: boolean}, ....]]
+    grid = Grid(nutrient, available, owner)
 
-    Grids used throughout the program must adhere to the above structure
-    Each cell of the grid is an object with keys:
+    Grids used throughout the program are instances of Grid. Each cell
+    (i, j) of the grid is described by the arrays:
         nutrient: whether a nutrient is at the location
         available: if a nutrient is present, has it been used.
+        owner: id of the node that acquired the nutrient, NO_OWNER otherwise.
+
+    The nutrient mask never changes during a build, so copies share it
+    read-only. available and owner live in one contiguous buffer so a
+    copy of the mutable state is a single memcpy. That buffer is only
+    allocated on the first write, so a grid over a large memory mapped or
+    shared nutrient map (see shared.py) costs nothing until it is built on.
+
+Legacy grids:
+    grid = [[{nutrient: boolean, available: boolean}, ....]]
+
+    The old list-of-dicts format is still accepted by as_grid / Pareto.set_grid
+    and can be produced with Grid.to_cells.
 """
+import numpy as np
+from pareto.shared import load_nutrient_map, nutrient_source, SharedMapHandle
+
+NO_OWNER = -1
+
+
+def _state_layout(shape):
+    """
+    Byte offsets of the available and owner blocks in the state buffer.
+    The owner block is padded to start on an int32 boundary.
+    """
+    n = int(shape[0]) * int(shape[1])
+    owner_offset = -(-n // 4) * 4
+    return n, owner_offset, owner_offset + 4 * n
+
+
+class Grid:
+    """
+    Array backed grid of nutrients.
+
+    nutrient: 2d bool array - read only after construction. Read-only bool
+              arrays (memory mapped, shared) are used without a copy
+    available: 2d bool array - defaults to all True
+    owner: 2d int32 array - defaults to NO_OWNER
+    """
+    def __init__(self, nutrient, available=None, owner=None):
+        nutrient = np.asarray(nutrient)
+        if nutrient.dtype != np.bool_ or nutrient.flags.writeable:
+            # copy so the mask can't change under the grid. Read-only bool
+            # masks (memory mapped or shared) are used as they are.
+            nutrient = np.array(nutrient, dtype=np.bool_)
+        if nutrient.ndim != 2:
+            raise ValueError(f"nutrient must be 2d, got shape {nutrient.shape}")
+        nutrient.flags.writeable = False
+        self.nutrient = nutrient
+        self.source = None
+
+        self._set_state(None)
+        if available is not None or owner is not None:
+            self.available[...] = True if available is None else available
+            self.owner[...] = NO_OWNER if owner is None else owner
+
+    def __getstate__(self):
+        # a grid over a nutrient map pickles the path / handle, not the map
+        nutrient = None if self.source is not None else self.nutrient
+        return {'nutrient': nutrient, 'source': self.source, 'state': self._state}
+
+    def __setstate__(self, d):
+        self.source = d.get('source')
+        nutrient = d['nutrient'] if self.source is None else nutrient_source(self.source)
+        nutrient.flags.writeable = False
+        self.nutrient = nutrient
+        self._set_state(d['state'])
+
+    def _set_state(self, state):
+        """
+        state=None is a pristine grid: every cell available, no owners. Its
+        buffer is allocated on first write, so copies of it cost nothing
+        until they are built on.
+        """
+        self._state = state
+        if state is None:
+            self._available = self._owner = None
+            return
+        shape = self.nutrient.shape
+        n, owner_offset, _ = _state_layout(shape)
+        self._available = state[:n].view(np.bool_).reshape(shape)
+        self._owner = state[owner_offset:owner_offset + 4 * n].view(np.int32).reshape(shape)
+
+    def _materialize(self):
+        _, _, size = _state_layout(self.nutrient.shape)
+        self._set_state(np.empty(size, dtype=np.uint8))
+        self._available[...] = True
+        self._owner[...] = NO_OWNER
+
+    @property
+    def pristine(self):
+        """
+        True while the state buffer is unallocated.
+        """
+        return self._state is None
+
+    @property
+    def available(self):
+        if self._state is None:
+            self._materialize()
+        return self._available
+
+    @property
+    def owner(self):
+        if self._state is None:
+            self._materialize()
+        return self._owner
+
+    @property
+    def nbytes(self):
+        """
+        Bytes of the mutable state, i.e. what a copy costs.
+        """
+        return 0 if self._state is None else self._state.nbytes
+
+    @property
+    def shape(self):
+        return self.nutrient.shape
+
+    @property
+    def n_rows(self):
+        return self.nutrient.shape[0]
+
+    @property
+    def n_cols(self):
+        return self.nutrient.shape[1]
+
+    def copy(self):
+        """
+        Copy of the grid. The nutrient mask is shared, the available and
+        owner state is copied with one memcpy, or not at all while pristine.
+        """
+        grid = Grid.__new__(Grid)
+        grid.nutrient = self.nutrient
+        grid.source = self.source
+        grid._set_state(None if self._state is None else self._state.copy())
+        return grid
+
+    def index_bounds(self, grid_width, grid_height, unit_length):
+        """
+        (i_min, i_max, j_min, j_max) of the cells a build may index, clipped
+        to the grid so a nutrient map smaller than the build area can be used.
+        """
+        return (
+            0, min(int(grid_width // unit_length), self.n_rows),
+            0, min(int(grid_height // unit_length), self.n_cols)
+        )
+
+    def acquirable(self, ii, jj):
+        """
+        Mask of the cells (ii, jj) holding an available nutrient.
+        """
+        if self._state is None:
+            return self.nutrient[ii, jj]
+        return self.nutrient[ii, jj] & self.available[ii, jj]
+
+    def take(self, ii, jj, node_id):
+        self.available[ii, jj] = False
+        self.owner[ii, jj] = node_id
+
+    def release(self, ii, jj):
+        self.available[ii, jj] = True
+        self.owner[ii, jj] = NO_OWNER
+
+    def owned_ids(self):
+        """
+        Owner id of every acquired cell.
+        """
+        if self._state is None:
+            return np.empty(0, dtype=np.int32)
+        return self.owner[self.owner != NO_OWNER]
 
-def get_grid(width, height, unit_length=1, transform_func=None):
+    @classmethod
+    def from_npy(cls, path, mmap=True):
+        """
+        Pristine grid over the nutrient mask stored in a .npy file. With mmap
+        the mask is memory mapped read-only instead of loaded.
+        """
+        if mmap:
+            return cls.from_source(path)
+        return cls(load_nutrient_map(path, mmap))
+
+    @classmethod
+    def from_source(cls, source):
+        """
+        Pristine grid over a nutrient map given as a .npy path (memory
+        mapped) or a SharedMapHandle. Pickles as the source, so grids sent
+        to other processes re-attach to the map instead of copying it.
+        """
+        grid = cls(nutrient_source(source))
+        grid.source = source
+        return grid
+
+    @classmethod
+    def from_cells(cls, cells):
+        """
+        Build a Grid from the legacy list-of-dicts format.
+        """
+        if not _cells_are_valid(cells):
+            raise ValueError("Invalid legacy grid: expected [[{nutrient, available}, ...], ...]")
+        nutrient = [[bool(cell['nutrient']) for cell in row] for row in cells]
+        available = [[bool(cell['available']) for cell in row] for row in cells]
+        owner = [[_legacy_owner(cell) for cell in row] for row in cells]
+        return cls(nutrient, available, owner)
+
+    def to_cells(self):
+        """
+        Export to the legacy list-of-dicts format.
+        """
+        nutrient = self.nutrient.tolist()
+        available = self.available.tolist()
+        owner = self.owner.tolist()
+        cells = []
+        for n_row, a_row, o_row in zip(nutrient, available, owner):
+            row = []
+            for n, a, o in zip(n_row, a_row, o_row):
+                cell = {'nutrient': n, 'available': a}
+                if o != NO_OWNER:
+                    cell['acquired_by_node_id'] = o
+                row.append(cell)
+            cells.append(row)
+        return cells
+
+
+def _legacy_owner(cell):
+    owner = cell.get('acquired_by_node_id')
+    return NO_OWNER if owner is None else int(owner)
+
+
+def _cells_are_valid(cells):
+    valid = type(cells) == list and len(cells) and type(cells[0]) == list
+    if not valid:
+        return False
+
+    for row in cells:
+        for cell in row:
+            valid = valid and type(cell) == dict
+            valid = valid and 'nutrient' in cell
+            valid = valid and 'available' in cell
+    return bool(valid)
+
+
+def as_grid(grid):
+    """
+    Adapter for grids given in either format. Returns a Grid, other grid
+    types (e.g. TiledGrid) are returned as they are. A .npy path or a
+    SharedMapHandle gives a pristine Grid over that nutrient map.
+    """
+    if isinstance(grid, list):
+        return Grid.from_cells(grid)
+    if isinstance(grid, (str, SharedMapHandle)):
+        return Grid.from_source(grid)
+    return grid
+
+
+def legacy_transform(transform_func):
+    """
+    Wrap a transform function written for the legacy list-of-dicts format
+    so it can be passed to get_grid.
+    """
+    def wrapped(grid):
+        return as_grid(transform_func(grid.to_cells()))
+    return wrapped
+
+
+def get_grid(width, height, unit_length=1, transform_func=None, nutrient=None):
     """
     Returns a grid of points with the given dimensions.
-    The width and height are broken into i-j indices by the 
+    The width and height are broken into i-j indices by the
     unit length.
 
     Params:
-        width: float 
-        height: float 
-        unit_length: float - distribute 
-        transform_func: function - takes the grid as parameter and 
-                        returns a valid grid. The grid is uniform 
-                        with nutrients so that can be adjusted by 
-                        user here.
+        width: float
+        height: float
+        unit_length: float - distribute
+        transform_func: function - takes the grid as parameter and
+                        returns a valid grid. The grid is uniform
+                        with nutrients so that can be adjusted by
+                        user here. Functions written for the legacy
+                        format should be wrapped with legacy_transform.
+        nutrient: 2d bool array, .npy path or SharedMapHandle - nutrient
+                  map to use instead of the uniform one. Its shape sets the
+                  grid size. Read-only maps are not copied.
     """
     transform_func = transform_func if transform_func else lambda x: x
-    rows = int(height / unit_length)
-    cols = int(width / unit_length)
-    grid = [[{
-        'nutrient': True, 
-        'available': True,
-        'aquired_by_node_id': None
-    } for j in range(cols)] for i in range(rows)]
-    return transform_func(grid) 
+    if isinstance(nutrient, (str, SharedMapHandle)):
+        grid = Grid.from_source(nutrient)
+    elif nutrient is not None:
+        grid = Grid(nutrient)
+    else:
+        rows = int(height / unit_length)
+        cols = int(width / unit_length)
+        grid = Grid(np.ones((rows, cols), dtype=np.bool_))
+    return as_grid(transform_func(grid))
+
 
 def grid_is_valid(grid):
     """
     Takes a grid and checks and ensures it is valid.
     """
-    valid = type(grid) == list and len(grid) and type(grid[0]) == list 
-    if not valid:
-        return False
-    
-    for row in grid:
-        for cell in row:
-            valid = type(cell) == dict 
-            valid = valid and 'nutrient' in cell 
-            valid = valid and 'available' in cell
-    return valid
+    if isinstance(grid, list):
+        return _cells_are_valid(grid)
+    if not isinstance(grid, Grid):
+        return hasattr(grid, 'is_valid') and grid.is_valid()
+
+    shape = grid.nutrient.shape
+    valid = len(shape) == 2 and shape[0] > 0 and shape[1] > 0
+    valid = valid and grid.nutrient.dtype == np.bool_
+    if grid.pristine:
+        return bool(valid)
+    valid = valid and grid.available.shape == shape and grid.owner.shape == shape
+    valid = valid and grid.available.dtype == np.bool_
+    valid = valid and grid.owner.dtype == np.int32
+    # a cell can only be owned once it is no longer available
+    return bool(valid and not (grid.available & (grid.owner != NO_OWNER)).any())
+
 
 def grids_are_equal(grid1, grid2):
     """"
     Debugging function
     """
-    f = lambda x1, x2: x1['nutrient'] == x2['nutrient'] and x1['available'] == x2['available']
-    
-    equal = len(grid1) == len(grid2) and len(grid1[0]) == len(grid2[0])
-    for i in range(len(grid1)):
-        for j in range(len(grid1[0])):
-            equal = equal and f(grid1[i][j], grid2[i][j])
-    return equal
+    grid1, grid2 = as_grid(grid1), as_grid(grid2)
+    return (
+        grid1.shape == grid2.shape
+        and np.array_equal(grid1.nutrient, grid2.nutrient)
+        and np.array_equal(grid1.available, grid2.available)
+    )
+
 
 def grid_meta(grid):
     """"
     Debugging function
     """
     if not grid_is_valid(grid):
-        raise ValueError("Grid id not valid: Can't obtain metadata")    
-
-    flat_grid = [item for sublist in grid for item in sublist]
-    
-    n_rows = len(grid)
-    n_cols = len(grid[0])
-    n_cells = n_rows * n_cols
-    total_nutrients = sum([1 for gi in flat_grid if 'nutrient' in gi and gi['nutrient']])
-    nutrients_acquired = sum([1 for gi in flat_grid if 'available' in gi and not gi['available']])
+        raise ValueError("Grid id not valid: Can't obtain metadata")
+    grid = as_grid(grid)
 
+    n_rows, n_cols = grid.shape
     return {
         'n_rows': n_rows,
         'n_cols': n_cols,
-        'n_cells': n_cells,
-        'total_nutrients': total_nutrients,
-        'nutrients_acquired': nutrients_acquired
+        'n_cells': n_rows * n_cols,
+        'total_nutrients': int(np.count_nonzero(grid.nutrient)),
+        'nutrients_acquired': 0 if grid.pristine else int(grid.available.size - np.count_nonzero(grid.available))
     }
 
+
 def grid_ids(grid):
     """"
     debugging function
     """
     if not grid_is_valid(grid):
-        raise ValueError("Grid id not valid: Can't obtain grid ids")        
-    
-    ids = []
-    for row in grid:
-        for cell in row:
-            if 'acquired_by_node_id' in cell:
-                ids.append(cell['acquired_by_node_id']) 
+        raise ValueError("Grid id not valid: Can't obtain grid ids")
+    grid = as_grid(grid)
 
-    return ids
\ No newline at end of file
+    return grid.owner[grid.owner != NO_OWNER].tolist()
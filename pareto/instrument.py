@@ -0,0 +1,110 @@
+"""
+Instrument:
+    Opt-in timers and work counters for builds.
+
+        instrument = Instrumentation()
+        with instrument.phase('coverage'):
+            ...
+        instrument.count('cells_scanned', n)
+        instrument.iteration(i=i, tree_size=n)
+
+    Code paths take NULL by default, whose methods do nothing, so the
+    overhead when instrumentation is off is one no-op call per phase.
+"""
+import json
+import time
+from collections import defaultdict
+
+
+class _Phase:
+    __slots__ = ('instrument', 'name', 'start')
+
+    def __init__(self, instrument, name):
+        self.instrument = instrument
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        instrument = self.instrument
+        instrument.times[self.name] += time.perf_counter() - self.start
+        instrument.calls[self.name] += 1
+
+
+class Instrumentation:
+    """
+    times: {phase: seconds}
+    calls: {phase: number of times the phase ran}
+    counters: {name: total} - e.g. cells_scanned, bytes_copied
+    iterations: [{...}, ....] - one record per build iteration
+    """
+    enabled = True
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.iterations = []
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def iteration(self, **fields):
+        self.iterations.append(fields)
+
+    def totals(self):
+        return {
+            'times': dict(self.times),
+            'calls': dict(self.calls),
+            'counters': dict(self.counters),
+            'n_iterations': len(self.iterations)
+        }
+
+    def report(self):
+        """
+        Human readable summary, slowest phase first.
+        """
+        total = sum(self.times.values())
+        lines = [f"{'phase':<20}{'seconds':>12}{'share':>8}{'calls':>10}"]
+        for name, seconds in sorted(self.times.items(), key=lambda kv: -kv[1]):
+            share = seconds / total if total else 0
+            lines.append(f"{name:<20}{seconds:>12.6f}{share:>8.1%}{self.calls[name]:>10}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:<20}{n:>12}")
+        return "\n".join(lines)
+
+    def dump(self, fname):
+        with open(fname, 'w') as f:
+            json.dump(dict(self.totals(), iterations=self.iterations), f, indent=2)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullInstrumentation:
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, n=1):
+        pass
+
+    def iteration(self, **fields):
+        pass
+
+
+NULL = NullInstrumentation()
@@ -1,19 +1,143 @@
+"""
+Log:
+    Buffered, level gated logger. Messages use %-style arguments and are
+    only formatted when their level is enabled:
 
+        logger.info("coverage: %s", coverage)
 
-def getLogger(fname):
-    logger = MyLogger(fname)
+    Lines are kept in memory and written in one go when the buffer is
+    full, on flush/close, on error and at interpreter exit. A new logger
+    that truncates a file first flushes the live logger of that file, so
+    old lines never land after the new ones.
+
+    With records=True, structured records are also appended as JSON lines
+    to {fname}.jsonl:
+
+        logger.record(i=i, best_index=best_index, coverage=coverage)
+"""
+import json
+import weakref
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+CRITICAL = 50
+
+# the latest logger of each file
+_live = weakref.WeakValueDictionary()
+
+
+def getLogger(fname, level=INFO, records=False):
+    logger = BufferedLogger(fname, level=level, records=records)
     return logger
 
-class MyLogger:
+
+def _write(fname, lines):
+    if not lines:
+        return
+    with open(fname, 'a') as f:
+        f.write(''.join(lines))
+    lines.clear()
+
+
+class BufferedLogger:
+    """
+    fname: string - log file, truncated on creation unless open_with="a"
+    level: int - messages below level are dropped without formatting
+    records: bool - enable record() and write records to {fname}.jsonl
+    buffer_lines: int - lines kept in memory before writing
+    """
     def __init__(
-            self, 
+            self,
             fname,
-            open_with="w"
+            open_with="w",
+            level=INFO,
+            records=False,
+            buffer_lines=1000
         ):
-        self.fname = fname 
+        self.fname = fname
+        self.level = level
+        self.buffer_lines = buffer_lines
+        self._lines = []
+        earlier = _live.get(fname)
+        if earlier is not None and open_with == "w":
+            earlier.flush()
+        _live[fname] = self
         with open(self.fname, open_with):
             pass
-    
-    def info(self, message):
-        with open(self.fname, 'a') as f:
-            f.write(f"{message}\n")
+
+        self.records_fname = f"{fname}.jsonl" if records else None
+        self._records = []
+        if self.records_fname:
+            with open(self.records_fname, open_with):
+                pass
+
+        # flush whatever is left when the logger is collected or at exit
+        self._finalizers = [
+            weakref.finalize(self, _write, self.fname, self._lines),
+            weakref.finalize(self, _write, self.records_fname, self._records)
+        ]
+
+    def isEnabledFor(self, level):
+        return level >= self.level
+
+    def setLevel(self, level):
+        self.level = level
+        return self
+
+    def log(self, level, message, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        self._lines.append(f"{message}\n")
+        if len(self._lines) >= self.buffer_lines:
+            _write(self.fname, self._lines)
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+        self.flush()
+
+    def critical(self, message, *args):
+        self.log(CRITICAL, message, *args)
+        self.flush()
+
+    def record(self, **fields):
+        """
+        Append a structured record. No-op unless the logger was created with records=True.
+        """
+        if not self.records_fname:
+            return
+        self._records.append(json.dumps(fields) + "\n")
+        if len(self._records) >= self.buffer_lines:
+            _write(self.records_fname, self._records)
+
+    def flush(self):
+        _write(self.fname, self._lines)
+        if self.records_fname:
+            _write(self.records_fname, self._records)
+        return self
+
+    def close(self):
+        self.flush()
+        for finalizer in self._finalizers:
+            finalizer.detach()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+MyLogger = BufferedLogger
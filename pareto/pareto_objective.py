@@ -1,27 +1,168 @@
-from pareto.coverage import coverage
-from pareto.transport import transport
+from pareto.coverage import coverage, CoverageEngine
+from pareto.transport import transport, TransportEngine
 from pareto.grid import grid_is_valid
+from pareto.instrument import NULL
 import copy 
 import json
 
-def pareto_objective(tree, grid, beta, radius, unit_length, grid_width, grid_height):
+def pareto_objective(tree, grid, beta, radius, unit_length, grid_width, grid_height, instrument=NULL):
 
-    if not grid_is_valid(grid):
-        raise Exception('Invalid grid before pareto objective')
+    with instrument.phase('grid_is_valid'):
+        if not grid_is_valid(grid):
+            raise Exception('Invalid grid before pareto objective')
     
-    cval = coverage(tree, grid, radius, unit_length, grid_width, grid_height)
+    cval = coverage(tree, grid, radius, unit_length, grid_width, grid_height, instrument=instrument)
     
-    if not grid_is_valid(grid):
-        raise Exception('Invalid grid: Invalid grid after coverage.')
+    with instrument.phase('grid_is_valid'):
+        if not grid_is_valid(grid):
+            raise Exception('Invalid grid: Invalid grid after coverage.')
     
-    tval = transport(tree, grid)
+    with instrument.phase('transport'):
+        tval = transport(tree, grid)
 
-    if not grid_is_valid(grid):
-        raise Exception('Invalid grid: Invalid grid after transport.')
+    with instrument.phase('grid_is_valid'):
+        if not grid_is_valid(grid):
+            raise Exception('Invalid grid: Invalid grid after transport.')
     
     return {
         'beta': beta,
         'coverage': cval, 
         'transport': tval, 
         'value': beta * cval + (1 - beta) * tval
-    }
\ No newline at end of file
+    }
+
+
+class ObjectiveState:
+    """
+    Shared state for scoring moves without copying the tree or the grid.
+    Holds the coverage and transport engines of the committed tree. 
+    Candidates are scored with pure deltas and only the chosen move 
+    is committed.
+
+    Params:
+        grid: a valid Grid - owned by the state and updated on commit
+        beta: float
+        radius: float
+        unit_length: float
+        grid_width: float
+        grid_height: float
+        root: (float, float)
+        root_id: int
+        instrument: Instrumentation - optional, see instrument.py
+        spatial_index: bool - see CoverageEngine
+        availability_index: bool - see CoverageEngine
+    """
+    def __init__(
+        self, grid, beta, radius, unit_length, grid_width, grid_height, root=(0, 0), root_id=0, instrument=NULL,
+        spatial_index=False, availability_index=False
+    ):
+        with instrument.phase('grid_is_valid'):
+            if not grid_is_valid(grid):
+                raise Exception('Invalid grid before pareto objective')
+        self.beta = beta
+        self.instrument = instrument
+        self.coverage = CoverageEngine(
+            grid, radius, unit_length, grid_width, grid_height, instrument, spatial_index, availability_index
+        )
+        self.transport = TransportEngine(root, root_id)
+        self.coverage.add(root, root_id)
+        self.transport.acquire(root_id, self.coverage.total)
+
+    @classmethod
+    def restore(
+        cls, grid, tree, beta, radius, unit_length, grid_width, grid_height, instrument=NULL, spatial_index=False,
+        availability_index=False
+    ):
+        """
+        State of an existing Tree whose nutrients are recorded in the grid's
+        owners, e.g. loaded from a checkpoint.
+        """
+        state = cls.__new__(cls)
+        state.beta = beta
+        state.instrument = instrument
+        state.coverage = CoverageEngine(
+            grid, radius, unit_length, grid_width, grid_height, instrument, spatial_index, availability_index
+        )
+        state.coverage.total = len(grid.owned_ids())
+        state.transport = TransportEngine.from_tree(tree, grid, tree.coord(0))
+        return state
+
+    def copy(self):
+        """
+        Independent copy of the state, e.g. to branch the build.
+        """
+        state = ObjectiveState.__new__(ObjectiveState)
+        state.beta = self.beta
+        state.instrument = self.instrument
+        state.coverage = self.coverage.copy()
+        state.transport = self.transport.copy()
+        return state
+
+    @property
+    def grid(self):
+        return self.coverage.grid
+
+    @property
+    def tree(self):
+        """
+        The committed tree, see tree.py.
+        """
+        return self.transport.tree
+
+    def pval(self, cval, tval):
+        return {
+            'beta': self.beta,
+            'coverage': cval,
+            'transport': tval,
+            'value': self.beta * cval + (1 - self.beta) * tval
+        }
+
+    def objectives(self, parent_id, coord):
+        """
+        (coverage, transport) of the committed tree plus a node at coord
+        attached to parent_id. Does not change state.
+        """
+        gain = self.coverage.gain(coord)
+        cval = self.coverage.total + gain
+        with self.instrument.phase('transport'):
+            tval = self.transport.total + self.transport.delta(parent_id, coord, gain)
+        return cval, tval
+
+    def score(self, parent_id, coord):
+        """
+        Objective of the committed tree plus a node at coord attached to parent_id.
+        Does not change state.
+        """
+        return self.pval(*self.objectives(parent_id, coord))
+
+    def scores(self, parent_id, coords):
+        """
+        score of every coord attached to parent_id, with the gains of all the
+        coords looked up in one batch. Does not change state.
+        """
+        gains = self.coverage.gains(coords).tolist()
+        pvals = []
+        for coord, gain in zip(coords, gains):
+            cval = self.coverage.total + gain
+            with self.instrument.phase('transport'):
+                tval = self.transport.total + self.transport.delta(parent_id, coord, gain)
+            pvals.append(self.pval(cval, tval))
+        return pvals
+
+    def apply(self, parent_id, coord, node_id):
+        """
+        Add the node to the committed tree.
+        """
+        with self.instrument.phase('transport'):
+            self.transport.add_node(node_id, coord, parent_id)
+        gain = self.coverage.add(coord, node_id)
+        with self.instrument.phase('transport'):
+            self.transport.acquire(node_id, gain)
+        return self
+
+    def commit(self, parent_id, coord, node_id):
+        """
+        Add the node to the committed tree and return the new objective.
+        """
+        self.apply(parent_id, coord, node_id)
+        return self.pval(self.coverage.total, self.transport.total)
@@ -1,33 +1,66 @@
-
-
 import os
-import matplotlib.pyplot as plt
-import networkx as nx
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from pareto.tree import as_tree
+from pareto.front import pareto_front
 
-def plot_tree(fname, tree, title=None):
-    title = title if title else ""
+# figures are created with the Figure api, not pyplot, so nothing is kept
+# in pyplot's global figure list and every figure is freed once saved
 
 
+def _make_folder(fname):
     folder = os.path.dirname(fname)
     if folder and not os.path.exists(folder):
-        os.makedirs(folder)
+        os.makedirs(folder, exist_ok=True)
+
+
+def _new_figure():
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def tree_segments(tree):
+    """
+    Edges of a tree (a Tree or an nx tree) as a (n_edges, 2, 2) array of
+    coordinates, and the nodes as a (n_nodes, 2) array.
+    """
+    tree = as_tree(tree)
+    return tree.segments(), tree.coords
 
-    pos = nx.spring_layout(tree)
-    nx.draw(tree, pos, with_labels=False)
-    plt.title(f'{title}')
-    plt.savefig(fname)
+
+def plot_segments(fname, segments, nodes, title=None):
+    """
+    Draw a tree from its edge segments and node coordinates.
+    """
+    _make_folder(fname)
+    fig, ax = _new_figure()
+    ax.add_collection(LineCollection(segments, colors='k', linewidths=1))
+    if len(nodes):
+        ax.scatter(nodes[:, 0], nodes[:, 1], s=8, zorder=2)
+    ax.autoscale()
+    ax.set_aspect('equal', adjustable='datalim')
+    ax.set_title(title if title else "")
+    fig.savefig(fname)
+
+
+def plot_tree(fname, tree, title=None):
+    segments, nodes = tree_segments(tree)
+    plot_segments(fname, segments, nodes, title)
 
 
 def plot_pareto(fname, data):
-    
+    """
+    Draw the Pareto front of build results [{beta, value}, ....]. Dominated
+    points are left out, see front.py.
+    """
+    _make_folder(fname)
 
-    folder = os.path.dirname(fname)
-    if folder and not os.path.exists(folder):
-        os.makedirs(folder)
-    
-    # Extract data for the Pareto plot
-    beta = [di['beta'] for di in data]
-    values = [di['value'] for di in data]
+    # Extract the front, ordered by coverage
+    values = [di['value'] for di in pareto_front(data)]
 
     x = [vi['coverage'] for vi in values]
     y = [vi['transport'] for vi in values]
@@ -38,16 +71,12 @@ def plot_pareto(fname, data):
 
     norm_x = [(xi - min_x) / (max_x - min_x) for xi in x] if max_x != min_x else x
     norm_y = [(yi - min_y) / (max_y - min_y) for yi in y] if max_y != min_y else y
-    trees = [di['tree'] for di in data]
 
     # Create the Pareto plot and save it
-    plt.figure()
-    plt.plot(norm_x, norm_y, marker='o')
-    plt.xlabel('Transport')
-    plt.ylabel('Coverage')
-    plt.title('Pareto Plot')
-
-    
-    plt.savefig(fname)
-    plt.close()
+    fig, ax = _new_figure()
+    ax.plot(norm_x, norm_y, marker='o')
+    ax.set_xlabel('Coverage')
+    ax.set_ylabel('Transport')
+    ax.set_title('Pareto Plot')
 
+    fig.savefig(fname)
@@ -0,0 +1,81 @@
+"""
+Render:
+    Draws figures on a background process pool so builds don't wait on
+    matplotlib.
+
+        with Renderer(workers=2) as renderer:
+            for ...:
+                renderer.tree(fname, tree, title)
+                renderer.pareto(fname, values)
+        # every figure is written once the block exits
+
+    Only what a plot needs is sent to the workers: edge segments and node
+    coordinates for trees, beta and value for pareto curves.
+    workers=0 draws in the calling process.
+
+    matplotlib is imported on the first figure, not with this module, so
+    compute only runs never pay for it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+
+class Renderer:
+    """
+    workers: int - number of render processes, 0 to render in process
+    max_pending: int - submitting blocks while this many figures are queued,
+                 so the queue can't grow without bound
+    """
+    def __init__(self, workers=2, max_pending=64):
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+        self.max_pending = max_pending
+        self.futures = []
+
+    def submit(self, func, *args):
+        if self.pool is None:
+            func(*args)
+            return
+        self._reap()
+        if len(self.futures) >= self.max_pending:
+            self.futures.pop(0).result()
+        self.futures.append(self.pool.submit(func, *args))
+
+    def _reap(self):
+        pending = []
+        for future in self.futures:
+            if future.done():
+                # raises the error of a failed render
+                future.result()
+            else:
+                pending.append(future)
+        self.futures = pending
+
+    def tree(self, fname, tree, title=None):
+        from pareto.plot_pareto import plot_segments, tree_segments
+        segments, nodes = tree_segments(tree)
+        self.submit(plot_segments, fname, segments, nodes, title)
+
+    def pareto(self, fname, data):
+        from pareto.plot_pareto import plot_pareto
+        data = [{'beta': di['beta'], 'value': di['value']} for di in data]
+        self.submit(plot_pareto, fname, data)
+
+    def wait(self):
+        """
+        Block until every submitted figure is written.
+        """
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,216 @@
+"""
+Scheduler:
+    Every (settings, data instance, beta) build is independent, so the whole
+    experiment matrix is expanded into tasks and run on a process pool.
+    Tasks are expanded and submitted lazily, so data can be streamed.
+
+    task = {name, data, settings, beta}
+        name: string - data name with the settings key, e.g. dataA-settingsA
+        data: dict - {name, length, n_segments} as returned by get_data()
+        settings: dict - {unit_length, radius, key, directions}
+        beta: float
+        cache: string - optional folder of a ResultCache, see cache.py
+        nutrient: optional nutrient map for every build - a .npy path or a
+                  SharedMapHandle, see shared.py. Only the path or handle is
+                  pickled to the workers, never the map.
+        checkpoints: string - optional folder the build checkpoints to, so
+                     a killed sweep resumes its unfinished builds, see
+                     checkpoint.py
+        artifacts: string - optional folder every build writes its artifact
+                   to, see artifact.py
+
+    Each task logs to its own file so parallel builds of the same instance
+    don't clobber ./logs/{name}.pareto.log.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from pareto.Pareto import Pareto
+from pareto.cache import ResultCache, build_key
+
+
+def task_name(data_instance, settings):
+    return f"{data_instance['name']}-{settings['key']}"
+
+
+def task_log_fname(task, log_dir='./logs'):
+    return os.path.join(log_dir, f"{task['name']}_{task['beta']:.2}.pareto.log")
+
+
+def task_checkpoint_fname(task):
+    return os.path.join(task['checkpoints'], f"{task['name']}_{task['beta']:.2}.ckpt.npz")
+
+
+def task_artifact_path(task):
+    return os.path.join(task['artifacts'], f"{task['name']}_{task['beta']:.2}")
+
+
+def iter_tasks(settings_list, data, betas, cache=None, nutrient=None, checkpoints=None, done=None, artifacts=None, reused=None):
+    """
+    Lazily expand data instances x settings x betas into tasks. data may
+    be any iterable, e.g. get_data.iter_real_data(), and is read once.
+
+    Parameters:
+        settings_list: [{unit_length, radius, key}, ...]
+        data: iterable of {name, length, n_segments}
+        betas: [float, ...]
+        cache: string - folder of a ResultCache shared by the tasks
+        nutrient: .npy path or SharedMapHandle - nutrient map shared by the tasks
+        checkpoints: string - folder of the build checkpoints
+        done: {(name, beta): key, ...} - builds already run, e.g.
+              checkpoint.done_tasks. A task is skipped when its build key
+              is the stored one
+        artifacts: string - folder of the build artifacts
+        reused: set - optional, the (name, beta) of every skipped task are added to it
+    """
+    done = done or {}
+    for di in data:
+        for settings in settings_list:
+            name = task_name(di, settings)
+            for beta in betas:
+                task = {
+                    'name': name,
+                    'data': di,
+                    'settings': settings,
+                    'beta': float(beta),
+                    'cache': cache,
+                    'nutrient': nutrient,
+                    'checkpoints': checkpoints,
+                    'artifacts': artifacts
+                }
+                key = done.get((name, task['beta']))
+                if key is not None and key == task_key(task):
+                    if reused is not None:
+                        reused.add((name, task['beta']))
+                    continue
+                yield task
+
+
+def expand_tasks(settings_list, data, betas, cache=None, nutrient=None, checkpoints=None, done=None, artifacts=None):
+    """
+    Expand settings x data instances x betas into a list of tasks. See iter_tasks.
+    """
+    return list(iter_tasks(settings_list, data, betas, cache, nutrient, checkpoints, done, artifacts))
+
+
+def task_pareto(task, log_fname=None):
+    """
+    The Pareto of a task, logging to log_fname, by default task_log_fname(task).
+    """
+    di = task['data']
+    settings = task['settings']
+    n_segments = di['n_segments']
+    pareto = Pareto(
+        task['name'],
+        task['beta'],
+        di['length'] / n_segments,
+        n_segments,
+        settings['radius'],
+        unit_length=settings['unit_length'],
+        directions=settings.get('directions'),
+        log_fname=log_fname or task_log_fname(task),
+        checkpoint=task_checkpoint_fname(task) if task.get('checkpoints') else None,
+        artifact=task_artifact_path(task) if task.get('artifacts') else None
+    )
+    if task.get('nutrient') is not None:
+        pareto.set_grid(task['nutrient'])
+    return pareto
+
+
+def task_key(task):
+    """
+    Build key of a task, see cache.build_key. Nothing is logged.
+    """
+    return build_key(task_pareto(task, log_fname=os.devnull))
+
+
+def run_task(task):
+    """
+    Build the optimal structure for one task.
+
+    Returns:
+        {name, beta, tree, grid, value, key} - key is the build key, see
+        pareto/cache.py
+    """
+    pareto = task_pareto(task)
+    cache = ResultCache(task['cache']) if task.get('cache') else None
+    key = build_key(pareto)
+    tree, grid, value = pareto.build(cache=cache, key=key)
+    return {
+        'name': task['name'],
+        'beta': task['beta'],
+        'tree': tree,
+        'grid': grid,
+        'value': value,
+        'key': key
+    }
+
+
+def run_tasks(tasks, workers=None, max_pending=None):
+    """
+    Run tasks on a process pool and yield results as they complete.
+
+    Parameters:
+        tasks: iterable of tasks - see iter_tasks. Consumed lazily.
+        workers: int - number of processes. Defaults to os.cpu_count().
+                 workers=1 runs in process, which is easier to debug.
+        max_pending: int - tasks submitted ahead of the results being
+                     consumed. Defaults to 2 x workers, so memory stays flat
+                     however many tasks there are.
+    """
+    if workers == 1:
+        for task in tasks:
+            yield run_task(task)
+        return
+
+    max_pending = max_pending or 2 * (workers or os.cpu_count())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for task in tasks:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(run_task, task))
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def _group_value(ri):
+    return {
+        'beta': ri['beta'],
+        'tree': ri['tree'],
+        # results read back from a results stream have no grid
+        'grid': ri.get('grid'),
+        'value': ri['value']
+    }
+
+
+def iter_groups(results, group_size):
+    """
+    Like group_results, but yields (name, values) as soon as the
+    group_size results of a name are in. Only unfinished groups are held.
+    """
+    groups = {}
+    for ri in results:
+        values = groups.setdefault(ri['name'], [])
+        values.append(_group_value(ri))
+        if len(values) == group_size:
+            del groups[ri['name']]
+            values.sort(key=lambda vi: vi['beta'])
+            yield ri['name'], values
+
+
+def group_results(results):
+    """
+    Group task results by name, sorted by beta, in the format returned
+    by build_pareto.
+
+    Returns:
+        {name: [{beta, tree, grid, value}, ....]}
+    """
+    grouped = {}
+    for ri in results:
+        grouped.setdefault(ri['name'], []).append(_group_value(ri))
+    for values in grouped.values():
+        values.sort(key=lambda vi: vi['beta'])
+    return grouped
@@ -0,0 +1,117 @@
+"""
+Shared:
+    Read-only nutrient maps that many builds use without copying.
+
+        nutrient = load_nutrient_map('field.npy')     # memory mapped
+        shared = SharedNutrientMap.create(nutrient)   # one copy in shared memory
+        handle = shared.handle                        # small and picklable
+        ...
+        nutrient = attach(handle)                     # in a worker, no copy
+        ...
+        shared.unlink()                               # in the owner, when done
+
+    A handle or a .npy path can be passed to Pareto.set_grid, and either
+    of them or an array to get_grid(..., nutrient=). Builds only write to
+    their own available and owner state, which a Grid allocates on first
+    write, so N concurrent builds over one field hold one physical copy of
+    the nutrient mask plus their own state.
+"""
+from collections import namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+# name: shared memory block, shape: (n_rows, n_cols). The mask is stored as bool.
+SharedMapHandle = namedtuple('SharedMapHandle', ['name', 'shape'])
+
+# blocks attached in this process, kept open for as long as the process lives
+_attached = {}
+
+
+def load_nutrient_map(path, mmap=True):
+    """
+    Nutrient mask stored in a .npy file. With mmap the file is memory
+    mapped read-only, so pages are only read when cells are indexed and
+    processes mapping the same file share the page cache.
+    Non bool arrays are converted (nonzero = nutrient), which reads them
+    fully into memory.
+    """
+    nutrient = np.load(path, mmap_mode='r' if mmap else None)
+    if nutrient.ndim != 2:
+        raise ValueError(f"nutrient map must be 2d, got shape {nutrient.shape} in {path}")
+    if nutrient.dtype != np.bool_:
+        nutrient = nutrient != 0
+    nutrient.flags.writeable = False
+    return nutrient
+
+
+def attach(handle):
+    """
+    Read-only view of a shared nutrient map.
+    """
+    shm = _attached.get(handle.name)
+    if shm is None:
+        # workers started by the owner share its resource tracker, which
+        # already knows the block, so attaching doesn't register a second owner
+        shm = shared_memory.SharedMemory(name=handle.name)
+        _attached[handle.name] = shm
+    nutrient = np.ndarray(tuple(handle.shape), dtype=np.bool_, buffer=shm.buf)
+    nutrient.flags.writeable = False
+    return nutrient
+
+
+class SharedNutrientMap:
+    """
+    Owner of a nutrient mask in shared memory.
+
+    handle: SharedMapHandle - pass this to other processes
+    nutrient: 2d bool array - read-only view of the shared block
+    """
+    def __init__(self, shm, shape):
+        self.shm = shm
+        self.handle = SharedMapHandle(shm.name, tuple(int(n) for n in shape))
+        self.nutrient = np.ndarray(self.handle.shape, dtype=np.bool_, buffer=shm.buf)
+        self.nutrient.flags.writeable = False
+
+    @classmethod
+    def create(cls, nutrient):
+        """
+        Copy a nutrient mask (array or .npy path) into a new shared block.
+        """
+        if isinstance(nutrient, str):
+            nutrient = load_nutrient_map(nutrient)
+        nutrient = np.asarray(nutrient)
+        if nutrient.ndim != 2:
+            raise ValueError(f"nutrient map must be 2d, got shape {nutrient.shape}")
+        shm = shared_memory.SharedMemory(create=True, size=max(nutrient.size, 1))
+        view = np.ndarray(nutrient.shape, dtype=np.bool_, buffer=shm.buf)
+        view[...] = nutrient != 0 if nutrient.dtype != np.bool_ else nutrient
+        return cls(shm, nutrient.shape)
+
+    def close(self):
+        # drop the view first, an exported buffer can't be closed
+        self.nutrient = None
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Close and free the block. Processes still attached keep their mapping.
+        """
+        self.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+
+
+def nutrient_source(source):
+    """
+    Nutrient mask from an array, a .npy path or a SharedMapHandle.
+    """
+    if isinstance(source, SharedMapHandle):
+        return attach(source)
+    if isinstance(source, str):
+        return load_nutrient_map(source)
+    return source
@@ -0,0 +1,150 @@
+"""
+Sink:
+    Append only JSONL stream of build results, one line per finished
+    (instance, beta) build, written as soon as it completes.
+
+    line = {name, beta, value, coords, parents, key}
+        value: {beta, coverage, transport, value}
+        coords, parents: the tree, see Tree.to_arrays
+        key: build key of the inputs and code of the build, see
+             cache.build_key. A rerun only reuses results whose key matches
+
+    Each line is written and flushed in one piece, so the file can be read
+    with read_results while a run is still appending to it. A line cut off
+    by a crash is skipped, and dropped when the stream is next opened for
+    appending, so new lines never follow it.
+"""
+import json
+import os
+from pareto.cache import tree_to_arrays, arrays_to_tree
+
+
+def result_record(name, beta, tree, value, key=None):
+    record = {'name': name, 'beta': beta, 'value': value}
+    record.update({field: arr.tolist() for field, arr in tree_to_arrays(tree).items()})
+    if key is not None:
+        record['key'] = key
+    return record
+
+
+def drop_partial_line(fname):
+    """
+    Truncate fname after its last complete line, removing what a crash cut
+    off mid write.
+    """
+    with open(fname, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(pos - 4096, 0)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            f.truncate(pos)
+
+
+class ResultSink:
+    """
+    fname: string - the .jsonl file
+    open_with: string - "a" to append to an existing stream, "w" to start over
+    fsync: bool - also sync each line to disk, for runs that must survive
+           a power loss, not just a crash
+    """
+    def __init__(self, fname, open_with="a", fsync=False):
+        folder = os.path.dirname(fname)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.fname = fname
+        self.fsync = fsync
+        if open_with == "a" and os.path.exists(fname):
+            drop_partial_line(fname)
+        self.f = open(fname, open_with)
+        self.n_written = 0
+
+    def write(self, name, beta, tree, value, key=None):
+        self.f.write(json.dumps(result_record(name, beta, tree, value, key)) + "\n")
+        self.f.flush()
+        if self.fsync:
+            os.fsync(self.f.fileno())
+        self.n_written += 1
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _records(fname):
+    """
+    Yield (offset, record) of every complete line that decodes.
+    """
+    offset = 0
+    with open(fname, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                # still being written, or cut off
+                break
+            line_offset, offset = offset, offset + len(line)
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # cut off by a crash before the stream was appended to again
+                continue
+            yield line_offset, record
+
+
+def _result(record, trees):
+    result = {
+        'name': record['name'],
+        'beta': record['beta'],
+        'value': record['value'],
+        'key': record.get('key')
+    }
+    if trees:
+        result['tree'] = arrays_to_tree(record['coords'], record['parents'])
+    return result
+
+
+def read_results(fname, trees=True):
+    """
+    Yield the results written so far, one at a time.
+
+    Returns:
+        generator of {name, beta, value, key, tree} - key is None for
+        results written without one, tree is a Tree, or omitted when
+        trees=False
+    """
+    for _, record in _records(fname):
+        yield _result(record, trees)
+
+
+def index_results(fname):
+    """
+    Where each build is in a results stream, so results can be read back
+    one at a time with read_result instead of all held in memory.
+
+    Returns:
+        {name: {beta: (key, offset)}} - of the last line of each build
+    """
+    index = {}
+    for offset, record in _records(fname):
+        index.setdefault(record['name'], {})[record['beta']] = (record.get('key'), offset)
+    return index
+
+
+def read_result(fname, offset, trees=True):
+    """
+    The result on the line at offset, see index_results.
+    """
+    with open(fname, 'rb') as f:
+        f.seek(offset)
+        return _result(json.loads(f.readline()), trees)
@@ -0,0 +1,113 @@
+"""
+Sweep:
+    The objective of a move, beta * coverage + (1 - beta) * transport, is
+    linear in beta. For a fixed state the greedy choice between the moves
+    only changes where two of these lines cross, so the greedy build over
+    a whole beta interval is a tree of decisions: follow the common prefix
+    and branch the state only at those breakpoints.
+
+    sweep_beta returns every distinct greedy tree with the exact beta
+    interval it is optimal for. At a breakpoint itself the moves tie and
+    build_optimal_structure resolves the tie by move order, so the point
+    belongs to whichever neighbouring interval wins that tie.
+"""
+
+
+def move_lines(objectives):
+    """
+    Lines value(beta) = intercept + slope * beta of the moves' (coverage, transport).
+    """
+    return [(tval, cval - tval) for cval, tval in objectives]
+
+
+def best_move(lines, beta):
+    """
+    Index of the best move at beta. Ties go to the first move, like
+    build_optimal_structure.
+    """
+    vals = [a + b * beta for a, b in lines]
+    return vals.index(max(vals))
+
+
+def upper_envelope(lines, lo, hi):
+    """
+    Split [lo, hi] into pieces on which a single move is best.
+
+    Returns:
+        [(lo, hi, index), ....] - ordered by beta
+    """
+    breaks = set()
+    for k, (a1, b1) in enumerate(lines):
+        for a2, b2 in lines[k + 1:]:
+            if b1 != b2:
+                beta = (a2 - a1) / (b1 - b2)
+                if lo < beta < hi:
+                    breaks.add(beta)
+    bounds = [lo] + sorted(breaks) + [hi]
+
+    pieces = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        index = best_move(lines, (a + b) / 2)
+        if pieces and pieces[-1][2] == index:
+            pieces[-1] = (pieces[-1][0], b, index)
+        else:
+            pieces.append((a, b, index))
+    return pieces
+
+
+def sweep_beta(pareto, lo=0.0, hi=1.0):
+    """
+    Run the greedy build of pareto for every beta in [lo, hi] at once.
+
+    Parameters:
+        pareto: Pareto - beta is ignored (may be None), everything else is used
+        lo: float
+        hi: float
+
+    Returns:
+        [{beta_interval, beta, tree, grid, value}, ....] ordered by beta
+            - beta_interval = (lo, hi) the tree is the greedy optimum for
+            - beta = midpoint of the interval, value is evaluated there
+            - value = {beta, coverage, transport, value}
+    """
+    root = (0, 0)
+    # (lo, hi, state, prev, prev_id, next iteration). Each state holds its own tree
+    stack = [(lo, hi, pareto.new_state(root), root, 0, 0)]
+    results = []
+
+    while stack:
+        lo, hi, state, prev, prev_id, start = stack.pop()
+
+        for i in range(start, pareto.n_segments):
+            node_id = i + 1
+            coords = pareto.moves(prev)
+            objectives = [state.objectives(prev_id, coord) for coord in coords]
+            pieces = upper_envelope(move_lines(objectives), lo, hi)
+
+            # branch a copy of the state for every piece but the first
+            for b_lo, b_hi, index in pieces[1:]:
+                branch = state.copy()
+                coord = coords[index]
+                branch.apply(prev_id, coord, node_id)
+                stack.append((b_lo, b_hi, branch, coord, node_id, i + 1))
+                pareto.logging.info("branch at i=%s: beta in [%s, %s] -> move %s", i, b_lo, b_hi, index)
+
+            lo, hi, index = pieces[0]
+            coord = coords[index]
+            state.apply(prev_id, coord, node_id)
+            prev = coord
+            prev_id = node_id
+
+        beta = (lo + hi) / 2
+        state.beta = beta
+        results.append({
+            'beta_interval': (lo, hi),
+            'beta': beta,
+            'tree': state.tree,
+            'grid': state.grid,
+            'value': state.pval(state.coverage.total, state.transport.total)
+        })
+
+    pareto.logging.flush()
+    results.sort(key=lambda ri: ri['beta_interval'])
+    return results
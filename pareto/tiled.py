@@ -0,0 +1,123 @@
+"""
+Tiled grid:
+    A grid split into square tiles of tile_size x tile_size cells that are
+    only allocated when a cell in them is first accessed. Memory scales
+    with the area the tree actually reaches, not with the bounding square
+    the dense Grid allocates up front.
+
+    Indices may be negative, so with bounds=None the grid extends in every
+    direction around the root at (0, 0). With bounds set to the dense
+    grid's extent, builds give the same results as on a dense Grid.
+
+    Each tile is a dense Grid, so tiles copy, validate and pickle the same
+    way.
+"""
+import numpy as np
+from pareto.grid import Grid, grid_is_valid
+
+
+class TiledGrid:
+    """
+    tile_size: int - cells per tile side
+    bounds: (i_min, i_max, j_min, j_max) - max exclusive, None for unbounded
+    nutrient_func: function (ii, jj) -> bool array - nutrient mask of the
+                   cells at global indices ii, jj, called once per tile.
+                   Defaults to a nutrient in every cell.
+    """
+    def __init__(self, tile_size=64, bounds=None, nutrient_func=None):
+        self.tile_size = tile_size
+        self.bounds = bounds
+        self.nutrient_func = nutrient_func
+        self.tiles = {}
+
+    @classmethod
+    def like(cls, width, height, unit_length=1, tile_size=64, nutrient_func=None):
+        """
+        Tiled grid with the same cells as get_grid(width, height, unit_length).
+        """
+        bounds = (0, int(width // unit_length), 0, int(height // unit_length))
+        return cls(tile_size, bounds, nutrient_func)
+
+    def _tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            ts = self.tile_size
+            if self.nutrient_func is None:
+                nutrient = np.ones((ts, ts), dtype=np.bool_)
+            else:
+                li, lj = np.indices((ts, ts))
+                nutrient = self.nutrient_func(li + key[0] * ts, lj + key[1] * ts)
+            tile = self.tiles[key] = Grid(nutrient)
+        return tile
+
+    def _split(self, ii, jj):
+        """
+        Yield (tile, mask, li, lj) for every tile the cells (ii, jj) fall in.
+        li, lj are the local indices of ii[mask], jj[mask] inside the tile.
+        """
+        if not len(ii):
+            return
+        ti, li = np.divmod(ii, self.tile_size)
+        tj, lj = np.divmod(jj, self.tile_size)
+        for a in range(int(ti.min()), int(ti.max()) + 1):
+            in_row = ti == a
+            for b in range(int(tj.min()), int(tj.max()) + 1):
+                mask = in_row & (tj == b)
+                if mask.any():
+                    yield self._tile((a, b)), mask, li[mask], lj[mask]
+
+    def index_bounds(self, grid_width, grid_height, unit_length):
+        return self.bounds
+
+    def acquirable(self, ii, jj):
+        out = np.zeros(len(ii), dtype=np.bool_)
+        for tile, mask, li, lj in self._split(ii, jj):
+            out[mask] = tile.acquirable(li, lj)
+        return out
+
+    def take(self, ii, jj, node_id):
+        for tile, _, li, lj in self._split(ii, jj):
+            tile.take(li, lj, node_id)
+
+    def release(self, ii, jj):
+        for tile, _, li, lj in self._split(ii, jj):
+            tile.release(li, lj)
+
+    def owned_ids(self):
+        owned = [tile.owned_ids() for tile in self.tiles.values()]
+        return np.concatenate(owned) if owned else np.empty(0, dtype=np.int32)
+
+    @property
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+    @property
+    def n_tiles(self):
+        return len(self.tiles)
+
+    def copy(self):
+        grid = TiledGrid(self.tile_size, self.bounds, self.nutrient_func)
+        grid.tiles = {key: tile.copy() for key, tile in self.tiles.items()}
+        return grid
+
+    def is_valid(self):
+        return self.tile_size > 0 and all(grid_is_valid(tile) for tile in self.tiles.values())
+
+    def to_grid(self):
+        """
+        Dense Grid of the bounded region. Untouched tiles are materialized.
+        """
+        if self.bounds is None:
+            raise ValueError("Unbounded tiled grid can't be converted to a dense Grid")
+        i_min, i_max, j_min, j_max = self.bounds
+        ii, jj = np.indices((i_max - i_min, j_max - j_min))
+        ii, jj = (ii + i_min).ravel(), (jj + j_min).ravel()
+        shape = (i_max - i_min, j_max - j_min)
+        nutrient = np.zeros(len(ii), dtype=np.bool_)
+        available = np.zeros(len(ii), dtype=np.bool_)
+        owner = np.zeros(len(ii), dtype=np.int32)
+        for tile, mask, li, lj in self._split(ii, jj):
+            nutrient[mask] = tile.nutrient[li, lj]
+            available[mask] = tile.available[li, lj]
+            owner[mask] = tile.owner[li, lj]
+        return Grid(nutrient.reshape(shape), available.reshape(shape), owner.reshape(shape))
@@ -1,54 +1,111 @@
-import math 
-import networkx as nx
-from pareto.grid import grid_ids
-
-def euclidean_distance(p, q):
-    return math.sqrt((p[0] - q[0])**2 + (p[1] - q[1])**2)
+import numpy as np
+from pareto.tree import Tree, as_tree, euclidean_distance
 
 distance = euclidean_distance
 def path_distance(tree, root, node):
+    import networkx as nx
     path = nx.shortest_path(tree, source=root, target=node)
     return sum(
         distance(path[i-1], path[i]) for i in range(1, len(path))
     )
 
 def find_node_by_id(G, search_id):
+    if isinstance(G, Tree):
+        if 0 <= search_id < len(G):
+            return G.coord(search_id), {'id': search_id}
+        raise ValueError(f"NODE ID: {search_id} not found. This should not happen.")
     for node, attrs in G.nodes(data=True):
         if attrs.get('id') == search_id:
             return node, attrs
     raise ValueError(f"NODE ID: {search_id} not found. This should not happen.")
 
 
+class TransportEngine:
+    """
+    Incremental transport. The tree stores every node's cumulative root
+    distance (its parent's distance plus one segment) and the engine the
+    number of nutrients each node acquired, so adding a node or scoring a
+    candidate is O(1) instead of a shortest path per owner over the whole grid.
+
+    Params:
+        root: (float, float) - coordinate of the root
+        root_id: int - id of the root node, always 0 in a Tree
+    """
+    def __init__(self, root=(0, 0), root_id=0):
+        if root_id != 0:
+            raise ValueError(f"root id must be 0, got {root_id}")
+        self.tree = Tree(root)
+        self.nutrients = [0]
+        self.total = 0
+
+    @classmethod
+    def from_tree(cls, tree, grid, root=(0, 0)):
+        """
+        Engine for an existing tree (a Tree or an nx tree) whose nutrients
+        are recorded in the grid's owners.
+        """
+        engine = cls(root)
+        engine.tree = as_tree(tree, root).copy()
+        engine.nutrients = [0] * len(engine.tree)
+
+        owner_ids, counts = np.unique(grid.owned_ids(), return_counts=True)
+        for node_id, count in zip(owner_ids.tolist(), counts.tolist()):
+            if not 0 <= node_id < len(engine.tree):
+                raise ValueError(f"NODE ID: {node_id} not found. This should not happen.")
+            engine.acquire(node_id, count)
+        return engine
+
+    def copy(self):
+        engine = TransportEngine.__new__(TransportEngine)
+        engine.tree = self.tree.copy()
+        engine.nutrients = list(self.nutrients)
+        engine.total = self.total
+        return engine
+
+    def distance_to(self, parent_id, coord):
+        """
+        Root distance of a node at coord attached to parent_id.
+        """
+        return self.tree.distance_to(parent_id, coord)
+
+    def distances_to(self, parent_ids, points):
+        """
+        Batched distance_to: root distances of nodes at points attached to parent_ids.
+        """
+        parents = self.tree.coords[parent_ids]
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        steps = np.sqrt((parents[:, 0] - points[:, 0])**2 + (parents[:, 1] - points[:, 1])**2)
+        return self.tree.root_distance[parent_ids] + steps
+
+    def delta(self, parent_id, coord, n_nutrients):
+        """
+        Transport added by a candidate node at coord with n_nutrients. Does not change state.
+        """
+        return n_nutrients * self.distance_to(parent_id, coord)
+
+    def add_node(self, node_id, coord, parent_id):
+        if self.tree.add_node(parent_id, coord) != node_id:
+            raise ValueError(f"NODE ID: {node_id} out of order. This should not happen.")
+        self.nutrients.append(0)
+        return self
+
+    def acquire(self, node_id, n_nutrients):
+        """
+        Record n_nutrients acquired by node_id. Returns the transport added.
+        """
+        self.nutrients[node_id] += n_nutrients
+        added = n_nutrients * float(self.tree.root_distance[node_id])
+        self.total += added
+        return added
+
+
 def transport(tree, grid):
     """"
     For each nutrient in the grid. Find its corresponding node in the 
     tree and compute the distance to the root of the tree.
 
     Parameters:
-        tree: nx.DiGraph()
-        grid: a valid grid as described in grid.py
+        tree: Tree or nx.DiGraph()
+        grid: a valid Grid as described in grid.py
     """
-    flat_grid = [item for sublist in grid for item in sublist]
-    ids = [ki['acquired_by_node_id'] for ki in flat_grid if 'acquired_by_node_id' in ki]
-    
-    nutrients_by_id = {ki: [] for ki in ids}
-    
-    root = (0, 0)
-    total_distance = 0
-    for row in grid:
-        for cell in row:
-            if 'acquired_by_node_id' in cell:
-                nutrients_by_id[cell['acquired_by_node_id']].append(cell)
-
-    for segment_group in nutrients_by_id:
-        target = None
-        for node, data in tree.nodes(data=True):
-            if data.get('id') == segment_group:
-                target = node
-                break
-        if not target:
-            print('returning early for not finding a node with the id, but this should not happen')
-
-        total_distance += len(nutrients_by_id[segment_group]) * path_distance(tree, root, target)
-
-    return total_distance
+    return TransportEngine.from_tree(tree, grid).total
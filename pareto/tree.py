@@ -0,0 +1,221 @@
+"""
+Tree:
+    tree = Tree(root)
+    node_id = tree.add_node(parent_id, coord)
+
+    Array backed tree. Node ids are the integers 0..n-1 in insertion order
+    and the root is 0, so a node's id indexes its row in every array:
+        coords: (n, 2) float - (x, y) of the node
+        parents: (n,) int - id of the parent, NO_PARENT for the root
+        depth: (n,) int - number of edges to the root
+        root_distance: (n,) float - length of the path to the root
+
+    The arrays grow by doubling, so add_node is amortized O(1), and
+    root_distance is computed from the parent's on insertion, so looking
+    it up is O(1). A copy is one array copy per field.
+
+    Builds return a Tree. to_networkx() gives the nx.DiGraph the program
+    used before, with coordinate tuples as nodes and the id on every node
+    and edge, and as_tree converts such graphs back. networkx is only
+    imported by to_networkx, builds never need it.
+"""
+import math
+import numpy as np
+
+NO_PARENT = -1
+
+
+def euclidean_distance(p, q):
+    return math.sqrt((p[0] - q[0])**2 + (p[1] - q[1])**2)
+
+distance = euclidean_distance
+
+
+class Tree:
+    """
+    root: (float, float) - coordinate of the root, node 0
+    capacity: int - initial number of rows
+    """
+    def __init__(self, root=(0, 0), capacity=64):
+        capacity = max(int(capacity), 1)
+        self._coords = np.empty((capacity, 2), dtype=np.float64)
+        self._parents = np.empty(capacity, dtype=np.int64)
+        self._depth = np.empty(capacity, dtype=np.int32)
+        self._root_distance = np.empty(capacity, dtype=np.float64)
+        self._coords[0] = root
+        self._parents[0] = NO_PARENT
+        self._depth[0] = 0
+        self._root_distance[0] = 0
+        self.n = 1
+
+    def __len__(self):
+        return self.n
+
+    def number_of_nodes(self):
+        return self.n
+
+    @property
+    def coords(self):
+        return self._coords[:self.n]
+
+    @property
+    def parents(self):
+        return self._parents[:self.n]
+
+    @property
+    def depth(self):
+        return self._depth[:self.n]
+
+    @property
+    def root_distance(self):
+        return self._root_distance[:self.n]
+
+    def _grow(self):
+        capacity = 2 * len(self._parents)
+        for name in ['_coords', '_parents', '_depth', '_root_distance']:
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def add_node(self, parent_id, coord):
+        """
+        Add a node at coord below parent_id. Returns its id.
+        """
+        if not 0 <= parent_id < self.n:
+            raise ValueError(f"NODE ID: {parent_id} not found. This should not happen.")
+        if self.n == len(self._parents):
+            self._grow()
+        node_id = self.n
+        self._coords[node_id] = coord
+        self._parents[node_id] = parent_id
+        self._depth[node_id] = self._depth[parent_id] + 1
+        self._root_distance[node_id] = self.distance_to(parent_id, coord)
+        self.n += 1
+        return node_id
+
+    def coord(self, node_id):
+        x, y = self._coords[node_id].tolist()
+        return x, y
+
+    def parent(self, node_id):
+        return int(self._parents[node_id])
+
+    def distance_to(self, parent_id, coord):
+        """
+        Root distance of a node at coord attached to parent_id.
+        """
+        return float(self._root_distance[parent_id]) + distance(self.coord(parent_id), coord)
+
+    def path(self, node_id):
+        """
+        Ids from the root to node_id.
+        """
+        ids = []
+        while node_id != NO_PARENT:
+            ids.append(int(node_id))
+            node_id = self._parents[node_id]
+        return ids[::-1]
+
+    def edges(self):
+        """
+        (n - 1, 2) array of (parent id, child id). The edge id is the child id.
+        """
+        return np.stack([self.parents[1:], np.arange(1, self.n)], axis=1)
+
+    def segments(self):
+        """
+        (n - 1, 2, 2) array of the edges as (parent coord, child coord).
+        """
+        return np.stack([self.coords[self.parents[1:]], self.coords[1:]], axis=1)
+
+    def copy(self):
+        tree = Tree.__new__(Tree)
+        tree._coords = self._coords.copy()
+        tree._parents = self._parents.copy()
+        tree._depth = self._depth.copy()
+        tree._root_distance = self._root_distance.copy()
+        tree.n = self.n
+        return tree
+
+    def __getstate__(self):
+        # only the used rows are pickled
+        return {
+            'coords': self.coords.copy(),
+            'parents': self.parents.copy(),
+            'depth': self.depth.copy(),
+            'root_distance': self.root_distance.copy()
+        }
+
+    def __setstate__(self, d):
+        self._coords = d['coords']
+        self._parents = d['parents']
+        self._depth = d['depth']
+        self._root_distance = d['root_distance']
+        self.n = len(self._parents)
+
+    def to_arrays(self):
+        """
+        {coords, parents} - enough to rebuild the tree with from_arrays.
+        """
+        return {'coords': self.coords.copy(), 'parents': self.parents.copy()}
+
+    @classmethod
+    def from_arrays(cls, coords, parents):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        parents = np.asarray(parents, dtype=np.int64)
+        if not len(parents) or parents[0] != NO_PARENT:
+            raise ValueError("Invalid tree arrays: node 0 must be the root")
+        tree = cls(coords[0], capacity=len(parents))
+        for node_id in range(1, len(parents)):
+            tree.add_node(int(parents[node_id]), coords[node_id])
+        return tree
+
+    @classmethod
+    def from_path(cls, path, root=(0, 0)):
+        """
+        Tree of a list of moves [(parent_id, coord, node_id), ...] in id order.
+        """
+        tree = cls(root, capacity=len(path) + 1)
+        for parent_id, coord, node_id in path:
+            if tree.add_node(parent_id, coord) != node_id:
+                raise ValueError(f"NODE ID: {node_id} out of order. This should not happen.")
+        return tree
+
+    def to_networkx(self):
+        """
+        nx.DiGraph with coordinate tuples as nodes and the id as a node and
+        edge attribute. Nodes at the same coordinate collapse into one, as
+        they did when builds used nx trees directly.
+        """
+        import networkx as nx
+        graph = nx.DiGraph()
+        nodes = [tuple(coord) for coord in self.coords.tolist()]
+        graph.add_node(nodes[0], id=0)
+        for node_id, parent_id in enumerate(self.parents.tolist()[1:], 1):
+            graph.add_node(nodes[node_id], id=node_id)
+            graph.add_edge(nodes[parent_id], nodes[node_id], id=node_id)
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph, root=(0, 0)):
+        """
+        Tree of an nx tree built with integer ids 0..n-1 on its nodes and edges.
+        """
+        ids = dict(graph.nodes(data='id'))
+        if ids.get(root) != 0:
+            raise ValueError("Invalid tree: the root must have id 0")
+        tree = cls(root, capacity=graph.number_of_nodes())
+        for parent, node, edge_id in sorted(graph.edges(data='id'), key=lambda edge: edge[2]):
+            if tree.add_node(ids[parent], node) != edge_id:
+                raise ValueError(f"NODE ID: {edge_id} out of order. This should not happen.")
+        return tree
+
+
+def as_tree(tree, root=(0, 0)):
+    """
+    Adapter for trees given as a Tree or an nx tree. Returns a Tree.
+    """
+    if isinstance(tree, Tree):
+        return tree
+    return Tree.from_networkx(tree, root)
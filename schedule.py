@@ -0,0 +1,97 @@
+import argparse
+import glob
+import os
+from collections import Counter
+from contextlib import nullcontext
+from itertools import chain
+from pareto.scheduler import iter_tasks, run_tasks, iter_groups
+from pareto.cache import ResultCache
+from pareto.shared import SharedNutrientMap
+from pareto.sink import ResultSink, read_results
+from pareto.checkpoint import done_tasks
+from get_data import get_data, iter_real_data
+from pareto.render import Renderer
+from main import get_experiment_settings, get_betas, tree_fname, report_front
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run every settings x data x beta build on a process pool.')
+    parser.add_argument('settings', nargs='*', help='settings json files. Defaults to ./settings/*.json')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes. Defaults to the cpu count.')
+    parser.add_argument('--real', action='store_true', help='stream instances from ./data/data.csv instead of get_data()')
+    parser.add_argument('--results', default=None, help='.jsonl file every finished build is appended to')
+    parser.add_argument('--cache', default=None, help='folder of the build cache. Builds are not cached without it.')
+    parser.add_argument('--clear-cache', action='store_true', help='empty the build cache before running')
+    parser.add_argument('--checkpoints', default=None, help='folder builds checkpoint to, a killed build resumes from its last checkpoint')
+    parser.add_argument('--artifacts', default=None, help='folder every build writes its binary artifact to, see pareto/artifact.py')
+    parser.add_argument('--fresh', action='store_true', help='rerun every build instead of skipping the ones already in --results')
+    parser.add_argument('--no-plot', action='store_true', help='only write numeric results. matplotlib is never imported.')
+    parser.add_argument('--nutrient', default=None, help='.npy nutrient map used by every build, shared read-only between the workers')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings_files = args.settings or sorted(glob.glob('./settings/*.json'))
+    settings_list = [get_experiment_settings(fi) for fi in settings_files]
+    data = iter_real_data() if args.real else get_data()
+
+    if args.cache and args.clear_cache:
+        ResultCache(args.cache).clear()
+
+    shared = SharedNutrientMap.create(args.nutrient) if args.nutrient else None
+    nutrient = shared.handle if shared else None
+    betas = get_betas()
+    # the results stream is the ledger of finished builds: a rerun skips the
+    # ones whose build key still matches and feeds them back in once the
+    # rest have run, so the curves of partly done instances complete
+    resume = args.results and not args.fresh
+    done = done_tasks(args.results) if resume else {}
+    reused = set()
+    if done:
+        print(f'resuming: {len(done)} builds in {args.results}, rebuilding those with a stale build key')
+    tasks = iter_tasks(
+        settings_list, data, betas, cache=args.cache, nutrient=nutrient,
+        checkpoints=args.checkpoints, done=done, artifacts=args.artifacts,
+        reused=reused
+    )
+
+    def previous():
+        # instances with every beta reused have nothing new to report
+        per_name = Counter(name for name, _ in reused)
+        for ri in read_results(args.results):
+            task_id = (ri['name'], ri['beta'])
+            if task_id in reused and ri['key'] == done[task_id] and per_name[ri['name']] < len(betas):
+                reused.discard(task_id)
+                yield ri
+
+    print(f'running: {len(settings_list)} settings x {len(betas)} betas per instance on {args.workers or os.cpu_count()} workers')
+
+    sink = ResultSink(args.results, open_with="w" if args.fresh else "a") if args.results else None
+    try:
+        with nullcontext() if args.no_plot else Renderer() as renderer:
+            def finished(results):
+                # each result is written and its tree drawn as soon as it's in
+                for ri in results:
+                    print(f"done: {ri['name']} - {ri['beta']:.2}")
+                    if sink:
+                        sink.write(ri['name'], ri['beta'], ri['tree'], ri['value'], ri['key'])
+                    if renderer:
+                        renderer.tree(tree_fname(ri['name'], ri['beta']), ri['tree'], title=f"{ri['name']} - {ri['beta']:.2}")
+                    yield ri
+
+            # curves once every beta of an instance is in
+            results = chain(finished(run_tasks(tasks, workers=args.workers)), previous() if done else iter([]))
+            for name, values in iter_groups(results, len(betas)):
+                report_front(name, values)
+                if renderer:
+                    renderer.pareto(f'./figures/{name}.pcurve.png', values)
+    finally:
+        if sink:
+            sink.close()
+        if shared:
+            shared.unlink()
+
+
+if __name__ == '__main__':
+    main()